@@ -4,19 +4,45 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from flask import Flask, render_template, jsonify, request, send_file, Response
+from flask import Flask, render_template, jsonify, request, Response, g
+from flask.json.provider import JSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from database import init_db, db
 from models.models import ThreatActor, OrganizationProfile, Changelog, Settings
-from services.analysis_service import get_relevant_actors, export_ttps_json
+from sqlalchemy import or_, text, bindparam, func, literal_column
+from sqlalchemy.orm import selectinload
+from services.analysis_service import get_relevant_actors, relevant_actors_query, export_ttps_json
 from services.avatar_service import generate_actor_avatar
-import json
-import io
-import sys
+from services.config_cache import get_profile_cached, get_trusted_domains_cached, clear_config_cache
+import orjson
+import bisect
+from functools import lru_cache
+from collections import namedtuple
+import re
+
+# orjson is considerably faster than stdlib json for the per-actor column parsing
+_loads = orjson.loads
+_dumps = lambda o: orjson.dumps(o).decode()
+
+class OrjsonProvider(JSONProvider):
+    """Route jsonify() and request JSON parsing through orjson."""
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Support both local and Docker database paths
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', 'sqlite:///taprofiler.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -42,7 +68,7 @@ limiter = Limiter(
 @app.template_filter('from_json')
 def from_json_filter(s):
     try:
-        return json.loads(s) if s else []
+        return _loads(s) if s else []
     except:
         return []
 
@@ -85,30 +111,72 @@ def request_entity_too_large(error):
     return jsonify({'error': 'Request payload too large. Maximum size is 16MB.'}), 413
 
 # Security: Validate JSON depth to prevent DoS via deeply nested structures
+MAX_JSON_DEPTH = 100
+
+# Matches a whole string literal (so brackets inside strings are skipped) or a
+# structural bracket. The possessive quantifiers never give back what they
+# consumed, and the closing quote is optional, so an unterminated string is
+# consumed in one linear pass instead of being retried from every later '"'.
+_JSON_NESTING_TOKEN = re.compile(rb'"(?:[^"\\]++|\\.)*+"?|[\[\]{}]', re.DOTALL)
+
+def json_depth_exceeds(body, max_depth=MAX_JSON_DEPTH):
+    """Scan raw JSON bytes and report whether nesting goes deeper than max_depth."""
+    depth = 0
+    for match in _JSON_NESTING_TOKEN.finditer(body):
+        token = match.group()
+        if token in (b'{', b'['):
+            depth += 1
+            if depth > max_depth:
+                return True
+        elif token in (b'}', b']'):
+            depth -= 1
+    return False
+
 @app.before_request
 def validate_json_request():
     if request.is_json and request.method in ['POST', 'PUT', 'PATCH']:
-        try:
-            # Set recursion limit for JSON parsing
-            original_limit = sys.getrecursionlimit()
-            sys.setrecursionlimit(100)  # Limit JSON nesting depth
-
-            # Try to parse JSON - will fail if too deeply nested
-            _ = request.get_json(force=True)
-
-            # Restore original limit
-            sys.setrecursionlimit(original_limit)
-        except RecursionError:
-            sys.setrecursionlimit(1000)  # Restore to safe default
+        body = request.get_data(cache=True)
+        if json_depth_exceeds(body):
             return jsonify({'error': 'JSON payload too deeply nested. Maximum depth is 100 levels.'}), 400
-        except Exception as e:
-            sys.setrecursionlimit(1000)  # Restore to safe default
+        try:
+            # Parse once here so route handlers can reuse the result
+            g.json_body = orjson.loads(body)
+        except orjson.JSONDecodeError:
             # Let other errors pass through to be handled normally
             pass
 
-@app.route('/')
-def index():
-    # Pass unique values for filters to the template
+# Filter dropdown options only change when the enricher writes new data, so they
+# are cached and recomputed whenever a new changelog entry appears
+_filter_options_cache = {'key': None, 'options': None}
+
+def _distinct_json_values(column, element="value", exclude=()):
+    """Sorted distinct non-empty elements of a JSON array column across all actors (SQLite json_each), as a tuple."""
+    sql = (
+        f"SELECT DISTINCT {element} AS v FROM threat_actor, json_each(threat_actor.{column}) "
+        f"WHERE {element} IS NOT NULL AND {element} != ''"
+    )
+    for i, value in enumerate(exclude):
+        sql += f" AND {element} != :exclude_{i}"
+    sql += " ORDER BY v"
+    params = {f"exclude_{i}": value for i, value in enumerate(exclude)}
+    return tuple(row[0] for row in db.session.execute(text(sql), params))
+
+def _compute_filter_options():
+    """Collect the unique values offered by the index page filters."""
+    if db.engine.dialect.name == 'sqlite':
+        return {
+            'origins': _distinct_json_values('origin_countries', exclude=('Unknown',)),
+            'victim_sectors': _distinct_json_values('victim_sectors', exclude=('Unknown',)),
+            'victim_countries': _distinct_json_values('victim_countries', exclude=('Unknown',)),
+            'motivations': _distinct_json_values('motivations'),
+            'badges': _distinct_json_values('badges'),
+            'malware': _distinct_json_values(
+                'associated_malware',
+                element="CASE WHEN type = 'object' THEN json_extract(value, '$.label') END"
+            )
+        }
+
+    # Fallback for databases without json_each: aggregate in Python
     all_actors = ThreatActor.query.all()
     origins = set()
     victim_sectors = set()
@@ -120,43 +188,54 @@ def index():
     for actor in all_actors:
         try:
             # Origin countries
-            for o in json.loads(actor.origin_countries):
+            for o in actor.origin_countries_list:
                 if o and o != "Unknown": origins.add(o)
 
             # Victim sectors
-            for s in json.loads(actor.victim_sectors):
+            for s in actor.victim_sectors_list:
                 if s and s != "Unknown": victim_sectors.add(s)
 
             # Victim countries
-            for c in json.loads(actor.victim_countries):
+            for c in actor.victim_countries_list:
                 if c and c != "Unknown": victim_countries.add(c)
 
             # Motivations (from Feedly - more detailed)
-            feedly_motivations = json.loads(actor.motivations) if actor.motivations else []
-            for m in feedly_motivations:
+            for m in actor.motivations_list:
                 if m: motivations.add(m)
 
             # Badges (sources like MALPEDIA, MISP)
-            actor_badges = json.loads(actor.badges) if actor.badges else []
-            for b in actor_badges:
+            for b in actor.badges_list:
                 if b: badges.add(b)
 
             # Associated malware
-            malware_list = json.loads(actor.associated_malware) if actor.associated_malware else []
-            for mal in malware_list:
-                if isinstance(mal, dict) and 'label' in mal:
-                    malware.add(mal['label'])
+            malware.update(actor.malware_labels)
         except Exception as e:
             print(f"Error processing actor filters: {e}")
             pass
 
-    return render_template('index.html',
-                           origins=sorted(list(origins)),
-                           victim_sectors=sorted(list(victim_sectors)),
-                           victim_countries=sorted(list(victim_countries)),
-                           motivations=sorted(list(motivations)),
-                           badges=sorted(list(badges)),
-                           malware=sorted(list(malware)))
+    # Cached as immutable sorted tuples, like the SQL path returns
+    return {
+        'origins': tuple(sorted(origins)),
+        'victim_sectors': tuple(sorted(victim_sectors)),
+        'victim_countries': tuple(sorted(victim_countries)),
+        'motivations': tuple(sorted(motivations)),
+        'badges': tuple(sorted(badges)),
+        'malware': tuple(sorted(malware))
+    }
+
+def get_filter_options():
+    """Return cached filter options, rebuilding them after new enrichment data lands."""
+    # Changelog ids only ever grow, and every actor create/update writes one
+    cache_key = db.session.query(func.max(Changelog.id)).scalar()
+    if _filter_options_cache['options'] is None or _filter_options_cache['key'] != cache_key:
+        _filter_options_cache['options'] = _compute_filter_options()
+        _filter_options_cache['key'] = cache_key
+    return _filter_options_cache['options']
+
+@app.route('/')
+def index():
+    # Pass unique values for filters to the template
+    return render_template('index.html', **get_filter_options())
 
 def apply_actor_filters(actors, request_args):
     # Get all filter parameters
@@ -170,76 +249,171 @@ def apply_actor_filters(actors, request_args):
     max_popularity = request_args.get('max_popularity', type=int)
     search_query = request_args.get('search', '').lower()
 
-    filtered_results = []
-
-    for actor in actors:
-        # Search filter (name or aliases)
-        if search_query:
-            actor_name = actor.name.lower()
-            # Security fix: Handle null values before JSON parsing
-            actor_aliases = [a.lower() for a in json.loads(actor.aliases)] if actor.aliases else []
-            if search_query not in actor_name and not any(search_query in alias for alias in actor_aliases):
-                continue
-
-        # Origin Filter (OR logic: if actor has ANY of the selected origins)
-        if target_origins:
-            # Security fix: Handle null values before JSON parsing
-            actor_origins = json.loads(actor.origin_countries) if actor.origin_countries else []
-            if not any(o in actor_origins for o in target_origins):
-                continue
-
-        # Victim Sector Filter (OR logic)
-        if target_victim_sectors:
-            # Security fix: Handle null values before JSON parsing
-            actor_sectors = json.loads(actor.victim_sectors) if actor.victim_sectors else []
-            if not any(s in actor_sectors for s in target_victim_sectors):
-                continue
-
-        # Victim Country Filter (OR logic)
-        if target_victim_countries:
-            # Security fix: Handle null values before JSON parsing
-            actor_countries = json.loads(actor.victim_countries) if actor.victim_countries else []
-            if not any(c in actor_countries for c in target_victim_countries):
-                continue
-
-        # Motivation Filter (OR logic - check Feedly motivations)
-        if target_motivations:
-            actor_motivations = json.loads(actor.motivations) if actor.motivations else []
-            if not any(m in actor_motivations for m in target_motivations):
-                continue
-
-        # Badge Filter (OR logic)
-        if target_badges:
-            actor_badges = json.loads(actor.badges) if actor.badges else []
-            if not any(b in actor_badges for b in target_badges):
-                continue
-
-        # Malware Filter (OR logic)
-        if target_malware:
-            malware_list = json.loads(actor.associated_malware) if actor.associated_malware else []
-            actor_malware_labels = [m['label'] for m in malware_list if isinstance(m, dict) and 'label' in m]
-            if not any(m in actor_malware_labels for m in target_malware):
-                continue
-
-        # Popularity range filter
-        if min_popularity is not None and (not actor.popularity or actor.popularity < min_popularity):
-            continue
-        if max_popularity is not None and (not actor.popularity or actor.popularity > max_popularity):
-            continue
-
-        filtered_results.append(actor)
-
-    return filtered_results
+    # Build predicates for the active filters only, so the per-actor loop
+    # doesn't re-check filters that weren't requested
+    predicates = []
+
+    # Search filter (name or aliases)
+    if search_query:
+        predicates.append(lambda a: search_query in (a.name_lc or '') or search_query in (a.aliases_lc or ''))
+
+    # List filters use OR logic: the actor matches if it has ANY of the selected values
+    # Origin Filter
+    if target_origins:
+        origins = frozenset(target_origins)
+        predicates.append(lambda a: not origins.isdisjoint(a.origin_countries_set))
+
+    # Victim Sector Filter
+    if target_victim_sectors:
+        sectors = frozenset(target_victim_sectors)
+        predicates.append(lambda a: not sectors.isdisjoint(a.victim_sectors_set))
+
+    # Victim Country Filter
+    if target_victim_countries:
+        countries = frozenset(target_victim_countries)
+        predicates.append(lambda a: not countries.isdisjoint(a.victim_countries_set))
+
+    # Motivation Filter (check Feedly motivations)
+    if target_motivations:
+        motivations = frozenset(target_motivations)
+        predicates.append(lambda a: not motivations.isdisjoint(a.motivations_set))
+
+    # Badge Filter
+    if target_badges:
+        badges = frozenset(target_badges)
+        predicates.append(lambda a: not badges.isdisjoint(a.badges_set))
+
+    # Malware Filter
+    if target_malware:
+        malware = frozenset(target_malware)
+        predicates.append(lambda a: not malware.isdisjoint(a.malware_label_set))
+
+    # Popularity range filter
+    if min_popularity is not None:
+        predicates.append(lambda a: bool(a.popularity) and a.popularity >= min_popularity)
+    if max_popularity is not None:
+        predicates.append(lambda a: bool(a.popularity) and a.popularity <= max_popularity)
+
+    if not predicates:
+        return list(actors)
+    return [actor for actor in actors if all(p(actor) for p in predicates)]
+
+def _json_array_overlaps(column, values, key=None):
+    """
+    SQL clause matching rows whose JSON array column shares at least one
+    element with values (OR logic). Uses SQLite's json_each table function.
+    """
+    param = f"{column}_values"
+    # Guard json_extract so a non-object element can't fail the whole query
+    element = f"CASE WHEN type = 'object' THEN json_extract(value, '$.{key}') END" if key else "value"
+    return text(
+        f"EXISTS (SELECT 1 FROM json_each(threat_actor.{column}) WHERE {element} IN :{param})"
+    ).bindparams(bindparam(param, value=list(values), expanding=True))
+
+def filter_actor_query(query, request_args):
+    """
+    SQL-side equivalent of apply_actor_filters so filtered-out rows never
+    leave the database. Results are ordered by popularity descending.
+    """
+    target_origins = request_args.getlist('origin')
+    target_victim_sectors = request_args.getlist('victim_sector')
+    target_victim_countries = request_args.getlist('victim_country')
+    target_motivations = request_args.getlist('motivation')
+    target_badges = request_args.getlist('badge')
+    target_malware = request_args.getlist('malware')
+    min_popularity = request_args.get('min_popularity', type=int)
+    max_popularity = request_args.get('max_popularity', type=int)
+    search_query = request_args.get('search', '').lower()
+
+    # Search filter (name or aliases), escaping LIKE wildcards in user input
+    if search_query:
+        escaped = search_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        pattern = f"%{escaped}%"
+        query = query.filter(or_(
+            ThreatActor.name_lc.like(pattern, escape='\\'),
+            ThreatActor.aliases_lc.like(pattern, escape='\\')
+        ))
+
+    if target_origins:
+        query = query.filter(_json_array_overlaps('origin_countries', target_origins))
+    if target_victim_sectors:
+        query = query.filter(_json_array_overlaps('victim_sectors', target_victim_sectors))
+    if target_victim_countries:
+        query = query.filter(_json_array_overlaps('victim_countries', target_victim_countries))
+    if target_motivations:
+        query = query.filter(_json_array_overlaps('motivations', target_motivations))
+    if target_badges:
+        query = query.filter(_json_array_overlaps('badges', target_badges))
+    if target_malware:
+        query = query.filter(_json_array_overlaps('associated_malware', target_malware, key='label'))
+
+    # Popularity range filter (actors without a popularity score never match)
+    if min_popularity is not None:
+        query = query.filter(ThreatActor.popularity != 0, ThreatActor.popularity >= min_popularity)
+    if max_popularity is not None:
+        query = query.filter(ThreatActor.popularity != 0, ThreatActor.popularity <= max_popularity)
+
+    # Literal 0 (not a bound parameter) so SQLite can use ix_threat_actor_popularity_sort
+    return query.order_by(func.coalesce(ThreatActor.popularity, literal_column('0')).desc())
+
+# Compact, immutable projection of the filterable columns. The Python fallback
+# filters these instead of full ORM objects, so non-matching actors never load
+# their descriptions or TTPs. Field names mirror ThreatActor's so the same
+# filter predicates apply to both.
+ActorFilterRow = namedtuple('ActorFilterRow', [
+    'id', 'name_lc', 'aliases_lc', 'popularity',
+    'origin_countries_set', 'victim_sectors_set', 'victim_countries_set',
+    'motivations_set', 'badges_set', 'malware_label_set'
+])
+
+def _actor_filter_rows(query):
+    """Load ActorFilterRow tuples for every actor matched by query."""
+    def as_set(raw):
+        return frozenset(_loads(raw)) if raw else frozenset()
+
+    rows = query.with_entities(
+        ThreatActor.id, ThreatActor.name_lc, ThreatActor.aliases_lc, ThreatActor.popularity,
+        ThreatActor.origin_countries, ThreatActor.victim_sectors, ThreatActor.victim_countries,
+        ThreatActor.motivations, ThreatActor.badges, ThreatActor.associated_malware
+    )
+    result = []
+    for (actor_id, name_lc, aliases_lc, popularity, origins, sectors,
+         countries, motivations, badges, malware) in rows:
+        malware_list = _loads(malware) if malware else []
+        result.append(ActorFilterRow(
+            actor_id, name_lc, aliases_lc, popularity,
+            as_set(origins), as_set(sectors), as_set(countries),
+            as_set(motivations), as_set(badges),
+            frozenset(m['label'] for m in malware_list if isinstance(m, dict) and 'label' in m)
+        ))
+    return result
+
+def query_filtered_actors(query, request_args):
+    """Filter and sort actors, in SQL when the database supports JSON functions."""
+    if db.engine.dialect.name == 'sqlite':
+        # Load every matched actor's TTPs in one IN query for serialization
+        return filter_actor_query(query, request_args).options(selectinload(ThreatActor.ttps)).all()
+
+    # Fallback for databases without json_each: filter compact rows in Python,
+    # then load full actors for the matches only
+    matches = apply_actor_filters(_actor_filter_rows(query), request_args)
+    # Sort by popularity descending
+    matches.sort(key=lambda x: x.popularity or 0, reverse=True)
+    ids = [row.id for row in matches]
+    actors = ThreatActor.query.filter(ThreatActor.id.in_(ids)).options(selectinload(ThreatActor.ttps)).all()
+    by_id = {actor.id: actor for actor in actors}
+    return [by_id[actor_id] for actor_id in ids]
+
+def actors_json_response(actors):
+    """Build the {"actors": [...]} API payload from each actor's pre-encoded JSON."""
+    body = b'{"actors":[' + b','.join(a.to_json_bytes() for a in actors) + b']}'
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/actors')
 @limiter.limit("10 per minute")
 def get_actors():
-    query = ThreatActor.query
-    actors = query.all()
-    filtered_actors = apply_actor_filters(actors, request.args)
-    # Sort by popularity descending
-    filtered_actors.sort(key=lambda x: x.popularity or 0, reverse=True)
-    return jsonify({"actors": [a.to_dict() for a in filtered_actors]})
+    filtered_actors = query_filtered_actors(ThreatActor.query, request.args)
+    return actors_json_response(filtered_actors)
 
 @app.route('/actor/<actor_id>/avatar.svg')
 def actor_avatar(actor_id):
@@ -247,28 +421,71 @@ def actor_avatar(actor_id):
     svg = generate_actor_avatar(actor)
     return Response(svg, mimetype='image/svg+xml')
 
-def sort_references_by_trust(references, trusted_domains):
-    """Sort references by trusted domain priority"""
-    if not references or not trusted_domains:
-        return references
+# Extracts the netloc of a URL ("scheme://netloc/...") without a full urlparse
+_NETLOC_RE = re.compile(r'^(?:[A-Za-z][A-Za-z0-9+.\-]*:)?//([^/?#]*)')
+
+def build_domain_priority(trusted_domains):
+    """
+    Build a function returning the trusted-domain priority of a URL (lower is better).
+
+    A URL's domain matches a trusted domain if either contains the other; the
+    lowest matching index wins and untrusted domains get len(trusted_domains).
+    All trusted domains are checked in a single regex pass per URL.
+    """
+    untrusted = len(trusted_domains)
+    # Zero-width lookahead so matches may overlap; at each position the
+    # alternatives are tried in priority order, so the group found there is
+    # the best trusted domain starting at that position
+    contained = re.compile('(?=' + '|'.join(f'({re.escape(d)})' for d in trusted_domains) + ')')
+    # Trusted domains joined in priority order; find() of a URL's domain lands
+    # in the first (best) trusted domain that contains it
+    joined = '\n'.join(trusted_domains)
+    starts = []
+    offset = 0
+    for trusted_domain in trusted_domains:
+        starts.append(offset)
+        offset += len(trusted_domain) + 1
 
     def get_domain_priority(url):
-        """Get priority score for URL based on trusted domains (lower is better)"""
         try:
-            from urllib.parse import urlparse
-            domain = urlparse(url).netloc
+            match = _NETLOC_RE.match(url)
+            domain = match.group(1) if match else ''
             # Remove www. prefix
             domain = domain.replace('www.', '')
 
-            # Check if domain matches any trusted domain
-            for idx, trusted_domain in enumerate(trusted_domains):
-                if trusted_domain in domain or domain in trusted_domain:
-                    return idx  # Lower index = higher priority
-            return len(trusted_domains)  # Untrusted domains go last
-        except:
-            return len(trusted_domains)  # On error, treat as untrusted
+            best = untrusted
+            for m in contained.finditer(domain):
+                best = min(best, m.lastindex - 1)
+                if best == 0:
+                    return 0
+            pos = joined.find(domain)
+            if pos != -1:
+                best = min(best, bisect.bisect_right(starts, pos) - 1)
+            return best
+        except Exception:
+            return untrusted  # On error, treat as untrusted
 
-    return sorted(references, key=get_domain_priority)
+    return get_domain_priority
+
+@lru_cache(maxsize=32)
+def _cached_domain_priority(trusted_domains):
+    return build_domain_priority(trusted_domains)
+
+@lru_cache(maxsize=512)
+def _sorted_references(references, trusted_domains):
+    return tuple(sorted(references, key=_cached_domain_priority(trusted_domains)))
+
+def sort_references_by_trust(references, trusted_domains):
+    """Sort references by trusted domain priority"""
+    if not references or not trusted_domains:
+        return references
+
+    # Memoized on the (references, trusted domains) pair so repeat profile views skip the sort
+    try:
+        return list(_sorted_references(tuple(references), tuple(trusted_domains)))
+    except TypeError:
+        # Unhashable reference entries - sort without caching
+        return sorted(references, key=build_domain_priority(trusted_domains))
 
 @app.route('/actor/<actor_id>')
 def actor_profile(actor_id):
@@ -276,22 +493,30 @@ def actor_profile(actor_id):
     changelog = Changelog.query.filter_by(actor_id=actor_id).order_by(Changelog.timestamp.desc()).all()
 
     # Get trusted domains and sort references
-    settings_obj = Settings.query.first()
-    trusted_domains = []
-    if settings_obj and settings_obj.trusted_domains:
-        trusted_domains = json.loads(settings_obj.trusted_domains)
+    trusted_domains = get_trusted_domains_cached()
 
     # Sort actor references by trusted domains
-    actor_refs = json.loads(actor.actor_references) if actor.actor_references else []
+    actor_refs = _loads(actor.actor_references) if actor.actor_references else []
     sorted_refs = sort_references_by_trust(actor_refs, trusted_domains)
 
     return render_template('actor_profile.html', actor=actor, changelog=changelog, sorted_references=sorted_refs)
 
+# Changelog entries shown per /changelog page
+CHANGELOG_PAGE_SIZE = 500
+
 @app.route('/changelog')
 def global_changelog():
-    # Join with ThreatActor to get actor names
-    logs = db.session.query(Changelog, ThreatActor.name).join(ThreatActor, Changelog.actor_id == ThreatActor.id).order_by(Changelog.timestamp.desc()).all()
-    return render_template('changelog.html', logs=logs)
+    page = max(request.args.get('page', 1, type=int), 1)
+    # Join with ThreatActor to get actor names; one extra row tells whether an older page exists
+    logs = (db.session.query(Changelog, ThreatActor.name)
+            .join(ThreatActor, Changelog.actor_id == ThreatActor.id)
+            .order_by(Changelog.timestamp.desc())
+            .offset((page - 1) * CHANGELOG_PAGE_SIZE)
+            .limit(CHANGELOG_PAGE_SIZE + 1)
+            .all())
+    has_older = len(logs) > CHANGELOG_PAGE_SIZE
+    return render_template('changelog.html', logs=logs[:CHANGELOG_PAGE_SIZE], page=page,
+                           page_size=CHANGELOG_PAGE_SIZE, has_older=has_older)
 
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
@@ -300,6 +525,7 @@ def settings():
         profile = OrganizationProfile(id=1, name="", sector="", country="")
         db.session.add(profile)
         db.session.commit()
+        clear_config_cache()
 
     # Get trusted domains settings
     settings_obj = Settings.query.first()
@@ -307,8 +533,9 @@ def settings():
         settings_obj = Settings(id=1, trusted_domains='[]')
         db.session.add(settings_obj)
         db.session.commit()
+        clear_config_cache()
 
-    trusted_domains = json.loads(settings_obj.trusted_domains) if settings_obj.trusted_domains else []
+    trusted_domains = _loads(settings_obj.trusted_domains) if settings_obj.trusted_domains else []
     trusted_domains_text = '\n'.join(trusted_domains)
 
     if request.method == 'POST':
@@ -317,6 +544,7 @@ def settings():
         profile.sector = data.get('sector')
         profile.country = data.get('country')
         db.session.commit()
+        clear_config_cache()
         return render_template('settings.html', profile=profile, trusted_domains_text=trusted_domains_text, saved=True)
 
     return render_template('settings.html', profile=profile, trusted_domains_text=trusted_domains_text)
@@ -332,8 +560,9 @@ def update_trusted_domains():
     domains_text = request.form.get('trusted_domains', '')
     domains = [line.strip() for line in domains_text.split('\n') if line.strip()]
 
-    settings_obj.trusted_domains = json.dumps(domains)
+    settings_obj.trusted_domains = _dumps(domains)
     db.session.commit()
+    clear_config_cache()
 
     # Redirect back to settings with success message
     profile = OrganizationProfile.query.first()
@@ -341,6 +570,7 @@ def update_trusted_domains():
         profile = OrganizationProfile(id=1, name="", sector="", country="")
         db.session.add(profile)
         db.session.commit()
+        clear_config_cache()
 
     trusted_domains_text = '\n'.join(domains)
     return render_template('settings.html', profile=profile, trusted_domains_text=trusted_domains_text, saved=True)
@@ -348,13 +578,19 @@ def update_trusted_domains():
 @app.route('/api/relevant_actors')
 @limiter.limit("10 per minute")
 def relevant_actors():
-    profile = OrganizationProfile.query.first()
-    actors = get_relevant_actors(profile)
+    profile = get_profile_cached()
     # Apply the same filters to relevant actors
-    filtered_actors = apply_actor_filters(actors, request.args)
-    # Sort by popularity descending
-    filtered_actors.sort(key=lambda x: x.popularity or 0, reverse=True)
-    return jsonify({"actors": [a.to_dict() for a in filtered_actors]})
+    query = relevant_actors_query(profile)
+    filtered_actors = query_filtered_actors(query, request.args)
+    return actors_json_response(filtered_actors)
+
+def json_attachment(data, filename):
+    """Send data as a pretty-printed JSON file download, encoded straight to bytes by orjson."""
+    return Response(
+        orjson.dumps(data, option=orjson.OPT_INDENT_2),
+        mimetype='application/json',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @app.route('/api/export_ttps', methods=['GET', 'POST'])
 @limiter.limit("5 per minute")
@@ -364,27 +600,17 @@ def export_ttps():
         # New enhanced export with custom parameters
         from services.analysis_service import export_ttps_custom
 
-        payload = request.get_json()
+        payload = g.json_body if 'json_body' in g else request.get_json()
         data = export_ttps_custom(payload)
 
-        # Create in-memory file
-        mem = io.BytesIO()
-        mem.write(json.dumps(data, indent=2).encode('utf-8'))
-        mem.seek(0)
-
-        return send_file(mem, as_attachment=True, download_name='mitre_attack_layer.json', mimetype='application/json')
+        return json_attachment(data, 'mitre_attack_layer.json')
     else:
         # Legacy GET endpoint - export relevant actors
-        profile = OrganizationProfile.query.first()
+        profile = get_profile_cached()
         actors = get_relevant_actors(profile)
         data = export_ttps_json(actors)
 
-        # Create in-memory file
-        mem = io.BytesIO()
-        mem.write(json.dumps(data, indent=2).encode('utf-8'))
-        mem.seek(0)
-
-        return send_file(mem, as_attachment=True, download_name='relevant_ttps.json', mimetype='application/json')
+        return json_attachment(data, 'relevant_ttps.json')
 
 if __name__ == '__main__':
     # Data enrichment is now handled by the separate TA-Enricher container
@@ -1,7 +1,29 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 
+# SQLite tuning applied to every new connection (webapp and enricher alike):
+# mmap avoids read() syscalls and a 64MB page cache keeps hot pages resident.
+# Only per-connection settings belong here: the webapp opens the database from
+# a read-only volume, so nothing may write to the file (e.g. journal_mode=WAL)
+SQLITE_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
 def init_db(app):
     db.init_app(app)
     with app.app_context():
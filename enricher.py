@@ -11,6 +11,7 @@ import schedule
 from dotenv import load_dotenv
 from database import init_db, db
 from services.mitre_service import fetch_and_parse_mitre_data
+from services.malpedia_service import clear_lookup_cache
 from flask import Flask
 
 # Load environment variables
@@ -41,6 +42,9 @@ def run_enrichment():
         print("=" * 70)
         print("TA-ENRICHER: Starting data enrichment cycle")
         print("=" * 70)
+        # Forget cached "no UUID" answers so actors updated on Malpedia are
+        # looked up again in this cycle
+        clear_lookup_cache()
         try:
             fetch_and_parse_mitre_data()
             print("=" * 70)
@@ -4,8 +4,10 @@ This is safer than deleting the database as it preserves existing data.
 """
 import sqlite3
 import os
+import orjson
 from app import app
 from database import db
+from models.models import build_search_keys
 
 def migrate_database():
     """Add new Feedly enrichment columns to existing database"""
@@ -31,40 +33,72 @@ def migrate_database():
         ("knowledge_base_url", "TEXT"),
         ("badges", "TEXT"),
         ("first_seen_at", "TEXT"),
-        ("feedly_id", "TEXT")
+        ("feedly_id", "TEXT"),
+        ("name_lc", "TEXT"),
+        ("aliases_lc", "TEXT")
     ]
 
     # Check which columns already exist
     cursor.execute("PRAGMA table_info(threat_actor)")
     existing_columns = {row[1] for row in cursor.fetchall()}
 
-    # Add missing columns
-    added_count = 0
+    # Indexes used by actor listing order and search
+    new_indexes = [
+        ("ix_threat_actor_popularity", "threat_actor (popularity)"),
+        ("ix_threat_actor_name_lc", "threat_actor (name_lc)"),
+        ("ix_threat_actor_popularity_sort", "threat_actor (coalesce(popularity, 0) DESC)")
+    ]
+
+    # Build the whole schema change as one script applied in a single transaction
+    missing_columns = []
     for column_name, column_type in new_columns:
         if column_name not in existing_columns:
-            try:
-                cursor.execute(f"ALTER TABLE threat_actor ADD COLUMN {column_name} {column_type}")
-                print(f"[+] Added column: {column_name}")
-                added_count += 1
-            except sqlite3.Error as e:
-                print(f"[!] Error adding column {column_name}: {e}")
+            missing_columns.append((column_name, column_type))
         else:
             print(f"[=] Column already exists: {column_name}")
 
-    # Create settings table if it doesn't exist
+    statements = [f"ALTER TABLE threat_actor ADD COLUMN {name} {col_type};" for name, col_type in missing_columns]
+    statements.append("""
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY,
+            trusted_domains TEXT
+        );""")
+    statements.extend(f"CREATE INDEX IF NOT EXISTS {index_name} ON {index_def};" for index_name, index_def in new_indexes)
+
+    script = "\n".join([
+        "BEGIN;",
+        *statements,
+        "COMMIT;"
+    ])
+
     try:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY,
-                trusted_domains TEXT
-            )
-        """)
-        print("[+] Settings table created or already exists")
+        cursor.executescript(script)
     except sqlite3.Error as e:
-        print(f"[!] Error creating settings table: {e}")
+        conn.rollback()
+        conn.close()
+        print(f"[!] Migration failed, no changes applied: {e}")
+        return
+
+    added_count = len(missing_columns)
+    for column_name, _ in missing_columns:
+        print(f"[+] Added column: {column_name}")
+    print("[+] Settings table created or already exists")
+    print(f"[+] Indexes created or already exist: {', '.join(name for name, _ in new_indexes)}")
+
+    # Backfill lowercased search keys (done in Python: SQLite's lower() is ASCII-only)
+    try:
+        cursor.execute("SELECT id, name, aliases FROM threat_actor WHERE name_lc IS NULL")
+        backfill = []
+        for actor_id, name, aliases in cursor.fetchall():
+            name_lc, aliases_lc = build_search_keys(name, orjson.loads(aliases) if aliases else [])
+            backfill.append((name_lc, aliases_lc, actor_id))
+        cursor.executemany("UPDATE threat_actor SET name_lc = ?, aliases_lc = ? WHERE id = ?", backfill)
+        conn.commit()
+        print(f"[+] Backfilled search keys for {len(backfill)} actor(s)")
+    except (sqlite3.Error, orjson.JSONDecodeError) as e:
+        conn.rollback()
+        print(f"[!] Error backfilling search keys: {e}")
 
-    # Commit changes
-    conn.commit()
     conn.close()
 
     if added_count > 0:
@@ -1,5 +1,20 @@
 from database import db
-import json
+from functools import cached_property
+import orjson
+
+_loads = orjson.loads
+
+def _json_list(raw):
+    """Parse a JSON array column, treating NULL/empty as an empty list."""
+    return _loads(raw) if raw else []
+
+def build_search_keys(name, aliases):
+    """Lowercased name and newline-joined lowercased aliases, stored for substring search."""
+    return (name or '').lower(), '\n'.join(a.lower() for a in aliases or [])
+
+def _raw_json(raw):
+    """JSON array column text as bytes, for splicing into a response without re-parsing."""
+    return raw.encode('utf-8') if raw else b'[]'
 
 # Association table for Actor <-> TTP
 actor_ttp = db.Table('actor_ttp',
@@ -12,6 +27,8 @@ class ThreatActor(db.Model):
     name = db.Column(db.String, nullable=False)
     description = db.Column(db.Text)
     aliases = db.Column(db.Text) # JSON string
+    name_lc = db.Column(db.String, index=True) # Lowercased name (search key)
+    aliases_lc = db.Column(db.Text) # Lowercased aliases, newline-joined (search key)
     origin_countries = db.Column(db.Text) # JSON string
     victim_sectors = db.Column(db.Text) # JSON string (enriched or inferred)
     victim_countries = db.Column(db.Text) # JSON string
@@ -21,7 +38,7 @@ class ThreatActor(db.Model):
     motivations = db.Column(db.Text) # JSON array of motivations
     associated_malware = db.Column(db.Text) # JSON array of malware objects
     target_entities = db.Column(db.Text) # JSON array of specific targets
-    popularity = db.Column(db.Integer) # Feedly popularity score
+    popularity = db.Column(db.Integer, index=True) # Feedly popularity score
     knowledge_base_url = db.Column(db.String) # Malpedia or other reference URL
     badges = db.Column(db.Text) # JSON array of badges (MALPEDIA, MISP, etc.)
     first_seen_at = db.Column(db.String) # ISO date string
@@ -37,31 +54,136 @@ class ThreatActor(db.Model):
     ttps = db.relationship('TTP', secondary=actor_ttp, lazy='subquery',
         backref=db.backref('actors', lazy=True))
 
+    # Parsed JSON columns, memoized per instance so filtering and
+    # serialization within one request only pay the parse cost once
+    @cached_property
+    def aliases_list(self):
+        return _json_list(self.aliases)
+
+    @cached_property
+    def origin_countries_list(self):
+        return _json_list(self.origin_countries)
+
+    @cached_property
+    def victim_sectors_list(self):
+        return _json_list(self.victim_sectors)
+
+    @cached_property
+    def victim_countries_list(self):
+        return _json_list(self.victim_countries)
+
+    @cached_property
+    def motivations_list(self):
+        return _json_list(self.motivations)
+
+    @cached_property
+    def badges_list(self):
+        return _json_list(self.badges)
+
+    @cached_property
+    def associated_malware_list(self):
+        return _json_list(self.associated_malware)
+
+    @cached_property
+    def malware_labels(self):
+        return [m['label'] for m in self.associated_malware_list if isinstance(m, dict) and 'label' in m]
+
+    # Set views for filter membership checks (frozenset.isdisjoint runs in C)
+    @cached_property
+    def origin_countries_set(self):
+        return frozenset(self.origin_countries_list)
+
+    @cached_property
+    def victim_sectors_set(self):
+        return frozenset(self.victim_sectors_list)
+
+    @cached_property
+    def victim_countries_set(self):
+        return frozenset(self.victim_countries_list)
+
+    @cached_property
+    def motivations_set(self):
+        return frozenset(self.motivations_list)
+
+    @cached_property
+    def badges_set(self):
+        return frozenset(self.badges_list)
+
+    @cached_property
+    def malware_label_set(self):
+        return frozenset(self.malware_labels)
+
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
             "description": self.description,
-            "aliases": json.loads(self.aliases) if self.aliases else [],
-            "origin_countries": json.loads(self.origin_countries) if self.origin_countries else [],
-            "victim_sectors": json.loads(self.victim_sectors) if self.victim_sectors else [],
-            "victim_countries": json.loads(self.victim_countries) if self.victim_countries else [],
+            "aliases": self.aliases_list,
+            "origin_countries": self.origin_countries_list,
+            "victim_sectors": self.victim_sectors_list,
+            "victim_countries": self.victim_countries_list,
             "motivation": self.motivation,
-            "motivations": json.loads(self.motivations) if self.motivations else [],
-            "associated_malware": json.loads(self.associated_malware) if self.associated_malware else [],
-            "target_entities": json.loads(self.target_entities) if self.target_entities else [],
+            "motivations": self.motivations_list,
+            "associated_malware": self.associated_malware_list,
+            "target_entities": _json_list(self.target_entities),
             "popularity": self.popularity,
             "knowledge_base_url": self.knowledge_base_url,
-            "badges": json.loads(self.badges) if self.badges else [],
+            "badges": self.badges_list,
             "first_seen_at": self.first_seen_at,
             "feedly_id": self.feedly_id,
             "attribution_confidence": self.attribution_confidence,
-            "type_of_incident": json.loads(self.type_of_incident) if self.type_of_incident else [],
-            "references": json.loads(self.actor_references) if self.actor_references else [],
-            "related_actors": json.loads(self.related_actors) if self.related_actors else [],
+            "type_of_incident": _json_list(self.type_of_incident),
+            "references": _json_list(self.actor_references),
+            "related_actors": _json_list(self.related_actors),
             "ttps": [t.to_dict() for t in self.ttps]
         }
 
+    def to_json_bytes(self):
+        """Serialize the same document as to_dict(), splicing stored JSON columns in verbatim."""
+        dumps = orjson.dumps
+        return b''.join((
+            b'{"id":', dumps(self.id),
+            b',"name":', dumps(self.name),
+            b',"description":', dumps(self.description),
+            b',"aliases":', _raw_json(self.aliases),
+            b',"origin_countries":', _raw_json(self.origin_countries),
+            b',"victim_sectors":', _raw_json(self.victim_sectors),
+            b',"victim_countries":', _raw_json(self.victim_countries),
+            b',"motivation":', dumps(self.motivation),
+            b',"motivations":', _raw_json(self.motivations),
+            b',"associated_malware":', _raw_json(self.associated_malware),
+            b',"target_entities":', _raw_json(self.target_entities),
+            b',"popularity":', dumps(self.popularity),
+            b',"knowledge_base_url":', dumps(self.knowledge_base_url),
+            b',"badges":', _raw_json(self.badges),
+            b',"first_seen_at":', dumps(self.first_seen_at),
+            b',"feedly_id":', dumps(self.feedly_id),
+            b',"attribution_confidence":', dumps(self.attribution_confidence),
+            b',"type_of_incident":', _raw_json(self.type_of_incident),
+            b',"references":', _raw_json(self.actor_references),
+            b',"related_actors":', _raw_json(self.related_actors),
+            b',"ttps":[', b','.join(t.to_json_bytes() for t in self.ttps), b']}'
+        ))
+
+# Parsed-column views memoized on ThreatActor instances. They are dropped whenever
+# the row is expired or reloaded so they never outlive the column values.
+_CACHED_ACTOR_VIEWS = tuple(
+    name for name, attr in vars(ThreatActor).items() if isinstance(attr, cached_property)
+)
+
+@db.event.listens_for(ThreatActor, 'expire')
+def _drop_cached_views_on_expire(target, attrs):
+    for name in _CACHED_ACTOR_VIEWS:
+        target.__dict__.pop(name, None)
+
+@db.event.listens_for(ThreatActor, 'refresh')
+def _drop_cached_views_on_refresh(target, context, attrs):
+    for name in _CACHED_ACTOR_VIEWS:
+        target.__dict__.pop(name, None)
+
+# Expression index backing ORDER BY COALESCE(popularity, 0) DESC on actor listings
+db.Index('ix_threat_actor_popularity_sort', db.func.coalesce(ThreatActor.popularity, 0).desc())
+
 class TTP(db.Model):
     id = db.Column(db.String, primary_key=True) # STIX ID
     mitre_id = db.Column(db.String) # e.g., T1001
@@ -75,9 +197,20 @@ class TTP(db.Model):
             "mitre_id": self.mitre_id,
             "name": self.name,
             "description": self.description,
-            "tactics": json.loads(self.tactics) if self.tactics else []
+            "tactics": _loads(self.tactics) if self.tactics else []
         }
 
+    def to_json_bytes(self):
+        """Serialize the same document as to_dict() without re-parsing tactics."""
+        dumps = orjson.dumps
+        return b''.join((
+            b'{"id":', dumps(self.id),
+            b',"mitre_id":', dumps(self.mitre_id),
+            b',"name":', dumps(self.name),
+            b',"description":', dumps(self.description),
+            b',"tactics":', _raw_json(self.tactics), b'}'
+        ))
+
 class OrganizationProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -116,5 +249,5 @@ class Settings(db.Model):
 
     def to_dict(self):
         return {
-            "trusted_domains": json.loads(self.trusted_domains) if self.trusted_domains else []
+            "trusted_domains": _loads(self.trusted_domains) if self.trusted_domains else []
         }
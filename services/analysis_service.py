@@ -1,13 +1,135 @@
-import json
+import orjson
 import os
+from functools import lru_cache
 import requests
-from models.models import ThreatActor, TTP
+from models.models import ThreatActor, TTP, actor_ttp
 from database import db
+from sqlalchemy import or_, text, false
 from services.http_client import safe_post, get_global_session
 
 # Get reusable session with proxy support
 _session = get_global_session()
 
+# ATT&CK Navigator layer template, read once at import
+LAYER_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'layer.json')
+try:
+    with open(LAYER_TEMPLATE_PATH, 'rb') as f:
+        _LAYER_TEMPLATE_BYTES = f.read()
+except OSError as e:
+    _LAYER_TEMPLATE_BYTES = None
+    print(f"[ERROR] Failed to load layer.json template: {e}")
+
+# Navigator technique entry templates (key order matches the layer format).
+# Exporters shallow-copy these and fill in the per-technique fields; the empty
+# metadata/links lists are shared between entries, which only get serialized.
+_GREEN_COLOR = "#31a354"
+_TECHNIQUE_WITH_TACTIC = {
+    "techniqueID": "", "tactic": "", "score": 0, "color": _GREEN_COLOR, "comment": "",
+    "enabled": True, "metadata": [], "links": [], "showSubtechniques": False
+}
+_TECHNIQUE_NO_TACTIC = {
+    "techniqueID": "", "score": 0, "color": _GREEN_COLOR, "comment": "",
+    "enabled": True, "metadata": [], "links": [], "showSubtechniques": False
+}
+# Custom exports leave colouring to the layer's gradient/colour settings
+_CUSTOM_TECHNIQUE_WITH_TACTIC = {
+    "techniqueID": "", "tactic": "", "score": 0, "comment": "",
+    "enabled": True, "metadata": [], "links": [], "showSubtechniques": False
+}
+_CUSTOM_TECHNIQUE_NO_TACTIC = {
+    "techniqueID": "", "score": 0, "comment": "",
+    "enabled": True, "metadata": [], "links": [], "showSubtechniques": False
+}
+
+@lru_cache(maxsize=8192)
+def _parse_tactics(raw):
+    """
+    Parse a TTP's stored tactics JSON into tactic short names.
+
+    Args:
+        raw: Tactics column value (JSON list of strings, or legacy kill chain phase dicts)
+
+    Returns:
+        frozenset of tactic names (e.g. {"execution"})
+    """
+    if not raw:
+        return frozenset()
+    tactics = set()
+    # Tactics are stored as list of strings in DB (e.g. ["execution"])
+    for tactic in orjson.loads(raw):
+        if isinstance(tactic, str):
+            tactics.add(tactic)
+        elif isinstance(tactic, dict) and 'phase_name' in tactic:
+            # Handle legacy format if any
+            tactics.add(tactic['phase_name'].replace('mitre-attack:', ''))
+    return frozenset(tactics)
+
+def load_layer_template():
+    """
+    Get a fresh, mutable copy of the layer template.
+
+    Returns:
+        Dictionary parsed from layer.json, or None if the template is unavailable
+    """
+    if _LAYER_TEMPLATE_BYTES is None:
+        print("[ERROR] layer.json template not available")
+        return None
+    try:
+        # orjson.loads builds new objects on every call, so no deepcopy is needed
+        return orjson.loads(_LAYER_TEMPLATE_BYTES)
+    except orjson.JSONDecodeError as e:
+        print(f"[ERROR] Failed to parse layer.json template: {e}")
+        return None
+
+def _relevance_conditions(user_profile):
+    """SQL conditions (SQLite json_each) matching actors that target the user's sector or country."""
+    conditions = []
+    if user_profile.sector:
+        conditions.append(text(
+            "EXISTS (SELECT 1 FROM json_each(threat_actor.victim_sectors) WHERE value = :user_sector)"
+        ).bindparams(user_sector=user_profile.sector))
+    if user_profile.country:
+        conditions.append(text(
+            "EXISTS (SELECT 1 FROM json_each(threat_actor.victim_countries) WHERE value = :user_country)"
+        ).bindparams(user_country=user_profile.country))
+    return conditions
+
+def relevant_actors_query(user_profile):
+    """
+    Query for actors that target the user's sector or country, so callers can
+    apply further filters before any rows are loaded.
+    """
+    if not user_profile:
+        return ThreatActor.query.filter(false())
+
+    if db.engine.dialect.name == 'sqlite':
+        conditions = _relevance_conditions(user_profile)
+        if not conditions:
+            return ThreatActor.query.filter(false())
+        return ThreatActor.query.filter(or_(*conditions))
+
+    # Fallback for databases without json_each
+    relevant_ids = [actor.id for actor in get_relevant_actors(user_profile)]
+    return ThreatActor.query.filter(ThreatActor.id.in_(relevant_ids))
+
+def _relevance_prefilter(user_profile):
+    """
+    Portable LIKE conditions that narrow the candidates for the sector/country
+    match. Values are quoted as they appear inside the stored JSON arrays, so a
+    substring hit is almost always a real element; callers still confirm with
+    the parsed sets. Returns None if a value cannot be matched this way.
+    """
+    conditions = []
+    for value, column in ((user_profile.sector, ThreatActor.victim_sectors),
+                          (user_profile.country, ThreatActor.victim_countries)):
+        if not value:
+            continue
+        # Non-ASCII values may be stored \u-escaped, so they can't be matched as text
+        if not value.isascii():
+            return None
+        conditions.append(column.contains(orjson.dumps(value).decode(), autoescape=True))
+    return conditions
+
 def get_relevant_actors(user_profile):
     """
     Find actors that target the user's sector or country.
@@ -15,82 +137,105 @@ def get_relevant_actors(user_profile):
     if not user_profile:
         return []
 
-    relevant_actors = []
-    all_actors = ThreatActor.query.all()
+    # Let the database do the membership test so only matching rows are loaded
+    if db.engine.dialect.name == 'sqlite':
+        return relevant_actors_query(user_profile).all()
 
     user_sector = user_profile.sector
     user_country = user_profile.country
+    if not user_sector and not user_country:
+        return []
 
-    for actor in all_actors:
-        victim_sectors = json.loads(actor.victim_sectors)
-        victim_countries = json.loads(actor.victim_countries)
-
-        is_relevant = False
-
-        # Check sector match
-        if user_sector and user_sector in victim_sectors:
-            is_relevant = True
-
-        # Check country match (if they attack the user's country)
-        if user_country and user_country in victim_countries:
-            is_relevant = True
+    query = ThreatActor.query
+    conditions = _relevance_prefilter(user_profile)
+    if conditions:
+        query = query.filter(or_(*conditions))
 
-        if is_relevant:
+    relevant_actors = []
+    for actor in query.yield_per(100):
+        # Check sector match, or country match (if they attack the user's country).
+        # The memoized frozensets make each check an O(1) hash lookup.
+        if (user_sector and user_sector in actor.victim_sectors_set) or \
+                (user_country and user_country in actor.victim_countries_set):
             relevant_actors.append(actor)
 
     return relevant_actors
 
-def fetch_ttps_from_feedly(actors):
+FEEDLY_TTP_DASHBOARD_URL = "https://api.feedly.com/v3/trends/ttp-dashboard"
+DEFAULT_TTP_PERIOD = {
+    "type": "Last3Months",
+    "label": "Last 3 Months"
+}
+
+# Feedly credentials are read once (http_client has already loaded .env)
+_FEEDLY_TOKEN = os.getenv('FEEDLY_API_TOKEN')
+_FEEDLY_HEADERS = {
+    "accept": "application/json",
+    "content-type": "application/json",
+    "Authorization": f"Bearer {_FEEDLY_TOKEN}"
+} if _FEEDLY_TOKEN else None
+
+def _fetch_ttps(actors, period_config):
     """
-    Make ONE Feedly API call to get TTPs for all relevant actors.
-    Returns a list of rows with TTP data and associated actors.
+    Make ONE Feedly TTP Dashboard API call for a set of actors.
+
+    Args:
+        actors: ThreatActor objects (only those with a feedly_id are sent)
+        period_config: Feedly period dict, e.g. {"type": "Last3Months", "label": "Last 3 Months"}
+
+    Returns:
+        List of rows with TTP data and associated actors (empty on error)
     """
     if not actors:
         return []
 
-    # Get Feedly API token
-    api_token = os.getenv('FEEDLY_API_TOKEN')
-    if not api_token:
+    if not _FEEDLY_HEADERS:
         print("[ERROR] FEEDLY_API_TOKEN not set in .env")
         return []
 
-    # Collect all Feedly entity IDs from relevant actors
-    threat_layer = []
-    for actor in actors:
-        if actor.feedly_id:
-            threat_layer.append(actor.feedly_id)
+    # Collect all Feedly entity IDs from the actors
+    threat_layer = [actor.feedly_id for actor in actors if actor.feedly_id]
 
     if not threat_layer:
-        print("[WARNING] No Feedly IDs found for relevant actors")
+        print("[WARNING] No Feedly IDs found for selected actors")
         return []
 
+    return _post_ttp_dashboard(threat_layer, period_config)
+
+def _post_ttp_dashboard(threat_layer, period_config):
+    """
+    POST one TTP Dashboard request. Touches no ORM state, so it is safe to
+    run from worker threads.
+
+    Args:
+        threat_layer: List of Feedly entity IDs
+        period_config: Feedly period dict
+
+    Returns:
+        List of TTP rows (empty on error)
+    """
     # Build payload for Feedly TTP Dashboard API
     # threatLayers is a list of lists. We put all our actors in one layer.
     payload = {
         "threatLayers": [threat_layer],
-        "period": {
-            "type": "Last3Months",
-            "label": "Last 3 Months"
-        }
-    }
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "Authorization": f"Bearer {api_token}"
+        "period": period_config
     }
 
-    url = "https://api.feedly.com/v3/trends/ttp-dashboard"
-
-    print(f"[INFO] Calling Feedly TTP Dashboard API for {len(threat_layer)} actors...")
-    response = safe_post(url, json_data=payload, headers=headers, timeout=60, session=_session)
+    print(f"[INFO] Calling Feedly TTP Dashboard API for {len(threat_layer)} actors with period: {period_config.get('label')}")
+    # Encode/decode with orjson directly instead of requests' stdlib json
+    # (the content-type header is part of _FEEDLY_HEADERS)
+    response = safe_post(FEEDLY_TTP_DASHBOARD_URL, headers=_FEEDLY_HEADERS, timeout=60,
+                         session=_session, data=orjson.dumps(payload))
 
     if response:
         try:
-            data = response.json()
+            data = orjson.loads(response.content)
             rows = data.get('rows', [])
             print(f"[INFO] Retrieved {len(rows)} TTPs from Feedly")
             return rows
+        except orjson.JSONDecodeError as e:
+            print(f"[ERROR] Feedly TTP Dashboard returned invalid JSON: {e}")
+            return []
         except Exception as e:
             print(f"[ERROR] Failed to parse Feedly TTP Dashboard response: {e}")
             return []
@@ -98,30 +243,20 @@ def fetch_ttps_from_feedly(actors):
         print(f"[ERROR] Feedly TTP Dashboard API call failed (check proxy settings if configured)")
         return []
 
-def export_ttps_json(actors):
+def _build_technique_map(ttp_rows):
     """
-    Export TTPs for a list of actors as MITRE ATT&CK Navigator layer JSON.
-    Makes ONE Feedly API call to get all TTPs and generates a layer file.
-    """
-    # Fetch TTP data from Feedly
-    ttp_rows = fetch_ttps_from_feedly(actors)
+    Aggregate Feedly TTP rows per technique and attach tactics from the database.
 
-    if not ttp_rows:
-        print("[WARNING] No TTP data retrieved from Feedly, using database TTPs")
-        # Fallback to database TTPs if Feedly call fails
-        return export_ttps_from_database(actors)
+    This is the hot loop of large exports, so lookups are hoisted into locals.
 
-    # Load the layer template
-    layer_template_path = os.path.join(os.path.dirname(__file__), '..', 'layer.json')
-    try:
-        with open(layer_template_path, 'r') as f:
-            layer_data = json.load(f)
-    except Exception as e:
-        print(f"[ERROR] Failed to load layer.json template: {e}")
-        return {}
+    Args:
+        ttp_rows: Rows from the Feedly TTP Dashboard (or the same shape built from the DB)
 
-    # Build technique score mapping: {mitre_id: {actors: set(), tactics: set()}}
+    Returns:
+        {mitre_id: {'actors': labels (list or set), 'tactics': set, 'name': str}}
+    """
     technique_map = {}
+    get_entry = technique_map.get
 
     for row in ttp_rows:
         ttp = row.get('ttp', {})
@@ -130,43 +265,73 @@ def export_ttps_json(actors):
         if not mitre_id:
             continue
 
-        # Initialize if not present
-        if mitre_id not in technique_map:
+        # Most techniques appear in a single row, so the first row's deduplicated
+        # label list is kept as is; it is only turned into a set once the same
+        # technique shows up again. Actors without a label are not counted.
+        labels = list(dict.fromkeys(label for actor in row.get('actors', [])
+                                    if (label := actor.get('label'))))
+        data = get_entry(mitre_id)
+        if data is None:
             technique_map[mitre_id] = {
-                'actors': set(),
+                'actors': labels,
                 'tactics': set(),
                 'name': ttp.get('name', '')
             }
-
-        # Add actors using this TTP
-        actors_list = row.get('actors', [])
-        for actor in actors_list:
-            technique_map[mitre_id]['actors'].add(actor.get('label', ''))
+            continue
+        actors = data['actors']
+        if type(actors) is list:
+            actors = data['actors'] = set(actors)
+        actors.update(labels)
 
     # Query database to get tactic information for all MITRE IDs at once
-    mitre_ids = list(technique_map.keys())
-    if mitre_ids:
-        # Optimize: Fetch all relevant TTPs in one query
-        db_ttps = TTP.query.filter(TTP.mitre_id.in_(mitre_ids)).all()
-        
-        for ttp_obj in db_ttps:
-            if ttp_obj.mitre_id in technique_map and ttp_obj.tactics:
-                try:
-                    tactics = json.loads(ttp_obj.tactics)
-                    # Tactics are stored as list of strings in DB (e.g. ["execution"])
-                    for tactic in tactics:
-                        if isinstance(tactic, str):
-                            technique_map[ttp_obj.mitre_id]['tactics'].add(tactic)
-                        elif isinstance(tactic, dict) and 'phase_name' in tactic:
-                            # Handle legacy format if any
-                            phase_name = tactic['phase_name'].replace('mitre-attack:', '')
-                            technique_map[ttp_obj.mitre_id]['tactics'].add(phase_name)
-                except Exception as e:
-                    print(f"[ERROR] Failed to parse tactics for {ttp_obj.mitre_id}: {e}")
+    if technique_map:
+        # Fetch only the two needed columns in one IN query (in_() iterates the
+        # dict's keys) and skip ORM hydration of TTP rows
+        db_ttps = db.session.query(TTP.mitre_id, TTP.tactics).filter(
+            TTP.mitre_id.in_(technique_map),
+            TTP.tactics.isnot(None)
+        ).yield_per(500)
+
+        for mitre_id, tactics_json in db_ttps:
+            if not tactics_json:
+                continue
+            try:
+                technique_map[mitre_id]['tactics'] |= _parse_tactics(tactics_json)
+            except Exception as e:
+                print(f"[ERROR] Failed to parse tactics for {mitre_id}: {e}")
+
+    return technique_map
+
+def fetch_ttps_from_feedly(actors):
+    """
+    Make ONE Feedly API call to get TTPs for all relevant actors (last 3 months).
+    Returns a list of rows with TTP data and associated actors.
+    """
+    return _fetch_ttps(actors, DEFAULT_TTP_PERIOD)
+
+def export_ttps_json(actors):
+    """
+    Export TTPs for a list of actors as MITRE ATT&CK Navigator layer JSON.
+    Makes ONE Feedly API call to get all TTPs and generates a layer file.
+    """
+    # Fetch TTP data from Feedly
+    ttp_rows = fetch_ttps_from_feedly(actors)
+
+    if not ttp_rows:
+        print("[WARNING] No TTP data retrieved from Feedly, using database TTPs")
+        # Fallback to database TTPs if Feedly call fails
+        return export_ttps_from_database(actors)
+
+    # Load the layer template
+    layer_data = load_layer_template()
+    if layer_data is None:
+        return {}
+
+    # Build technique score mapping: {mitre_id: {actors: labels, tactics: set()}}
+    technique_map = _build_technique_map(ttp_rows)
 
     # Build techniques array for layer JSON
     techniques = []
-    green_color = "#31a354"
 
     for mitre_id, data in technique_map.items():
         score = len(data['actors'])  # Score = number of actors using this technique
@@ -174,29 +339,17 @@ def export_ttps_json(actors):
         # If we have tactics, create one entry per tactic
         if data['tactics']:
             for tactic in data['tactics']:
-                techniques.append({
-                    "techniqueID": mitre_id,
-                    "tactic": tactic,
-                    "score": score,
-                    "color": green_color,
-                    "comment": "",
-                    "enabled": True,
-                    "metadata": [],
-                    "links": [],
-                    "showSubtechniques": False
-                })
+                entry = _TECHNIQUE_WITH_TACTIC.copy()
+                entry["techniqueID"] = mitre_id
+                entry["tactic"] = tactic
+                entry["score"] = score
+                techniques.append(entry)
         else:
             # No tactic info, create entry without tactic
-            techniques.append({
-                "techniqueID": mitre_id,
-                "score": score,
-                "color": green_color,
-                "comment": "",
-                "enabled": True,
-                "metadata": [],
-                "links": [],
-                "showSubtechniques": False
-            })
+            entry = _TECHNIQUE_NO_TACTIC.copy()
+            entry["techniqueID"] = mitre_id
+            entry["score"] = score
+            techniques.append(entry)
 
     # Update layer data with techniques
     layer_data['techniques'] = techniques
@@ -210,69 +363,53 @@ def export_ttps_from_database(actors):
     Fallback: Export TTPs using database relationships (old method).
     """
     # Load the layer template
-    layer_template_path = os.path.join(os.path.dirname(__file__), '..', 'layer.json')
-    try:
-        with open(layer_template_path, 'r') as f:
-            layer_data = json.load(f)
-    except Exception as e:
-        print(f"[ERROR] Failed to load layer.json template: {e}")
+    layer_data = load_layer_template()
+    if layer_data is None:
         return {}
 
-    # Build technique score mapping from database
+    # Build technique score mapping from database in one join over the
+    # association table instead of loading each actor's ttps relationship
     technique_map = {}
+    actor_ids = [actor.id for actor in actors]
+
+    if actor_ids:
+        rows = db.session.query(TTP.mitre_id, TTP.tactics).join(
+            actor_ttp, actor_ttp.c.ttp_id == TTP.id
+        ).filter(actor_ttp.c.actor_id.in_(actor_ids))
 
-    for actor in actors:
-        for ttp in actor.ttps:
-            if ttp.mitre_id not in technique_map:
-                technique_map[ttp.mitre_id] = {
+        for mitre_id, tactics_json in rows:
+            data = technique_map.get(mitre_id)
+            if data is None:
+                data = technique_map[mitre_id] = {
                     'count': 0,
                     'tactics': set()
                 }
 
-            technique_map[ttp.mitre_id]['count'] += 1
-
-            # Extract tactics
-            if ttp.tactics:
-                try:
-                    tactics = json.loads(ttp.tactics)
-                    for tactic in tactics:
-                        if isinstance(tactic, str):
-                            technique_map[ttp.mitre_id]['tactics'].add(tactic)
-                        elif isinstance(tactic, dict) and 'phase_name' in tactic:
-                            phase_name = tactic['phase_name'].replace('mitre-attack:', '')
-                            technique_map[ttp.mitre_id]['tactics'].add(phase_name)
-                except:
-                    pass
+                # Extract tactics (same for every row of this TTP)
+                if tactics_json:
+                    try:
+                        data['tactics'] = _parse_tactics(tactics_json)
+                    except:
+                        pass
+
+            data['count'] += 1
 
     # Build techniques array
     techniques = []
-    green_color = "#31a354"
 
     for mitre_id, data in technique_map.items():
         if data['tactics']:
             for tactic in data['tactics']:
-                techniques.append({
-                    "techniqueID": mitre_id,
-                    "tactic": tactic,
-                    "score": data['count'],
-                    "color": green_color,
-                    "comment": "",
-                    "enabled": True,
-                    "metadata": [],
-                    "links": [],
-                    "showSubtechniques": False
-                })
+                entry = _TECHNIQUE_WITH_TACTIC.copy()
+                entry["techniqueID"] = mitre_id
+                entry["tactic"] = tactic
+                entry["score"] = data['count']
+                techniques.append(entry)
         else:
-            techniques.append({
-                "techniqueID": mitre_id,
-                "score": data['count'],
-                "color": green_color,
-                "comment": "",
-                "enabled": True,
-                "metadata": [],
-                "links": [],
-                "showSubtechniques": False
-            })
+            entry = _TECHNIQUE_NO_TACTIC.copy()
+            entry["techniqueID"] = mitre_id
+            entry["score"] = data['count']
+            techniques.append(entry)
 
     layer_data['techniques'] = techniques
     layer_data['name'] = "Relevant Threat Actor TTPs"
@@ -345,7 +482,7 @@ def export_ttps_custom(config):
                     'ttp': {
                         'mitreId': ttp.mitre_id,
                         'name': ttp.name,
-                        'tactics': json.loads(ttp.tactics) if ttp.tactics else []
+                        'tactics': orjson.loads(ttp.tactics) if ttp.tactics else []
                     },
                     'actors': [{
                         'label': actor.name,
@@ -356,12 +493,8 @@ def export_ttps_custom(config):
         print(f"[INFO] Using {len(ttp_rows)} TTPs from database")
 
     # Load layer template
-    layer_template_path = os.path.join(os.path.dirname(__file__), '..', 'layer.json')
-    try:
-        with open(layer_template_path, 'r') as f:
-            layer_data = json.load(f)
-    except Exception as e:
-        print(f"[ERROR] Failed to load layer.json template: {e}")
+    layer_data = load_layer_template()
+    if layer_data is None:
         return {}
 
     # Get configuration options
@@ -369,89 +502,52 @@ def export_ttps_custom(config):
     show_subtechniques = config.get('show_subtechniques', True)
     aggregate_scores = config.get('aggregate_scores', True)
     include_metadata = config.get('include_metadata', False)
+    # The export modal doesn't send a scheme and relies on Navigator's score gradient
+    color_scheme = config.get('color_scheme', 'gradient')
 
     # Build technique map
-    technique_map = {}
-
-    for row in ttp_rows:
-        ttp = row.get('ttp', {})
-        mitre_id = ttp.get('mitreId')
-
-        if not mitre_id:
-            continue
-
-        if mitre_id not in technique_map:
-            technique_map[mitre_id] = {
-                'actors': set(),
-                'tactics': set(),
-                'name': ttp.get('name', ''),
-                'actor_list': []
-            }
-
-        # Add actors using this TTP
-        actors_list = row.get('actors', [])
-        for actor in actors_list:
-            actor_name = actor.get('label', '')
-            technique_map[mitre_id]['actors'].add(actor_name)
-            if include_metadata:
-                technique_map[mitre_id]['actor_list'].append(actor_name)
-
-    # Query database for tactic information
-    mitre_ids = list(technique_map.keys())
-    if mitre_ids:
-        db_ttps = TTP.query.filter(TTP.mitre_id.in_(mitre_ids)).all()
-
-        for ttp_obj in db_ttps:
-            if ttp_obj.mitre_id in technique_map and ttp_obj.tactics:
-                try:
-                    tactics = json.loads(ttp_obj.tactics)
-                    for tactic in tactics:
-                        if isinstance(tactic, str):
-                            technique_map[ttp_obj.mitre_id]['tactics'].add(tactic)
-                        elif isinstance(tactic, dict) and 'phase_name' in tactic:
-                            phase_name = tactic['phase_name'].replace('mitre-attack:', '')
-                            technique_map[ttp_obj.mitre_id]['tactics'].add(phase_name)
-                except Exception as e:
-                    print(f"[ERROR] Failed to parse tactics for {ttp_obj.mitre_id}: {e}")
+    technique_map = _build_technique_map(ttp_rows)
 
     # Build techniques array with filtering
     techniques = []
+    max_score = 0
 
     # Build technique entries
     for mitre_id, data in technique_map.items():
         score = len(data['actors']) if aggregate_scores else 1
 
-        # Build comment with actor metadata
-        comment = ""
-        if include_metadata and data['actor_list']:
-            comment = f"Used by: {', '.join(sorted(data['actor_list']))}"
-
         # Filter by selected tactics
         tactics_to_use = data['tactics'].intersection(selected_tactics) if selected_tactics else data['tactics']
+        if not tactics_to_use and selected_tactics:
+            # None of this technique's tactics were selected
+            continue
+
+        # Highest exported score, for the gradient range
+        if score > max_score:
+            max_score = score
+
+        # Build comment with actor metadata
+        comment = ""
+        if include_metadata and data['actors']:
+            comment = f"Used by: {', '.join(sorted(data['actors']))}"
 
         if tactics_to_use:
             for tactic in tactics_to_use:
-                techniques.append({
-                    "techniqueID": mitre_id,
-                    "tactic": tactic,
-                    "score": score,
-                    "comment": comment,
-                    "enabled": True,
-                    "metadata": [],
-                    "links": [],
-                    "showSubtechniques": show_subtechniques
-                })
-        elif not selected_tactics:
+                entry = _CUSTOM_TECHNIQUE_WITH_TACTIC.copy()
+                entry["techniqueID"] = mitre_id
+                entry["tactic"] = tactic
+                entry["score"] = score
+                entry["comment"] = comment
+                entry["showSubtechniques"] = show_subtechniques
+                techniques.append(entry)
+        else:
             # No tactic filtering, include without tactic
-            techniques.append({
-                "techniqueID": mitre_id,
-                "score": score,
-                "comment": comment,
-                "enabled": True,
-                "metadata": [],
-                "links": [],
-                "showSubtechniques": show_subtechniques
-            })
+            entry = _CUSTOM_TECHNIQUE_NO_TACTIC.copy()
+            entry["techniqueID"] = mitre_id
+            entry["score"] = score
+            entry["comment"] = comment
+            entry["showSubtechniques"] = show_subtechniques
+            techniques.append(entry)
 
     # Update layer metadata
     layer_data['techniques'] = techniques
@@ -472,50 +568,4 @@ def fetch_ttps_from_feedly_custom(actors, period_config):
     """
     Fetch TTPs from Feedly with custom period configuration.
     """
-    if not actors:
-        return []
-
-    api_token = os.getenv('FEEDLY_API_TOKEN')
-    if not api_token:
-        print("[ERROR] FEEDLY_API_TOKEN not set in .env")
-        return []
-
-    # Collect Feedly entity IDs
-    threat_layer = []
-    for actor in actors:
-        if actor.feedly_id:
-            threat_layer.append(actor.feedly_id)
-
-    if not threat_layer:
-        print("[WARNING] No Feedly IDs found for selected actors")
-        return []
-
-    # Build payload
-    payload = {
-        "threatLayers": [threat_layer],
-        "period": period_config
-    }
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "Authorization": f"Bearer {api_token}"
-    }
-
-    url = "https://api.feedly.com/v3/trends/ttp-dashboard"
-
-    print(f"[INFO] Calling Feedly TTP Dashboard API for {len(threat_layer)} actors with period: {period_config.get('label')}")
-    response = safe_post(url, json_data=payload, headers=headers, timeout=60, session=_session)
-
-    if response:
-        try:
-            data = response.json()
-            rows = data.get('rows', [])
-            print(f"[INFO] Retrieved {len(rows)} TTPs from Feedly")
-            return rows
-        except Exception as e:
-            print(f"[ERROR] Failed to parse Feedly TTP Dashboard response: {e}")
-            return []
-    else:
-        print(f"[ERROR] Feedly TTP Dashboard API call failed")
-        return []
+    return _fetch_ttps(actors, period_config)
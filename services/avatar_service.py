@@ -1,53 +1,175 @@
+import glob
 import hashlib
+import os
 import random
-import json
+import shutil
+import zlib
+import orjson
 import math
 
+# Generated avatars are cached on disk; the SVG only depends on the actor's
+# id, name and origin countries, so those make up the cache key. Bump
+# AVATAR_VERSION whenever the drawing changes: each version gets its own
+# directory and the others are deleted on the first cache write.
+AVATAR_VERSION = 5
+_AVATAR_CACHE_ROOT = os.path.join(os.path.dirname(__file__), '..', 'cache', 'avatars')
+AVATAR_CACHE_DIR = os.path.join(_AVATAR_CACHE_ROOT, f"v{AVATAR_VERSION}")
+# Earlier releases cached avatars in the served static directory
+_LEGACY_AVATAR_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'avatars')
+_stale_caches_pruned = False
+
+# Minified SVG fragment templates
+_SVG_OPEN = '<svg width="200" height="200" viewBox="0 0 200 200" xmlns="http://www.w3.org/2000/svg">'
+_SVG_CLOSE = '</svg>'
+_BACKGROUND = '<rect width="100%" height="100%" fill="#171717"/>'
+# Avatars are 200x200 and centred on (100, 100); fixed coordinates are baked
+# into the templates so the loops only format the randomised values
+_CX, _CY = 100, 100
+_RING = ('<circle cx="%d" cy="%d" r="%%d" fill="none" stroke="%%s" stroke-width="%%d" '
+         'stroke-dasharray="%%d %%g" opacity="%%.2f" transform="rotate(%%d %d %d)"/>') % (_CX, _CY, _CX, _CY)
+_HEXAGON = '<path d="%s" fill="%s" opacity="%.2f"/>'
+# Hexagon outlines for the 3x3 grid cells, in drawing order (column-major)
+_HEX_PATHS = tuple(
+    'M%d %d L%d %d L%d %d L%d %d L%d %d L%d %d Z' % (
+        x, y - 20, x + 17, y - 10, x + 17, y + 10,
+        x, y + 20, x - 17, y + 10, x - 17, y - 10
+    )
+    for x in (40, 100, 160)
+    for y in (40, 100, 160)
+)
+_NODE_LINE = '<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" stroke="%s" stroke-width="1" opacity="0.4"/>'
+_NODE_DOT = '<circle cx="%.2f" cy="%.2f" r="4" fill="%s" opacity="0.8"/>'
+_GLYPH = ('<rect x="%d" y="%d" width="%d" height="%d" rx="2" fill="none" stroke="%s" '
+          'stroke-width="2" opacity="0.5" transform="rotate(%d %g %g)"/>')
+_INITIALS = ('<text x="50%%" y="50%%" dy=".35em" text-anchor="middle" font-family="Arial, sans-serif" '
+             'font-weight="bold" font-size="60" fill="%s" opacity="0.1">%s</text>')
+
+# Unit-circle lookup table for the node pattern: node angles are random
+# anyway, so picking one of 256 evenly spaced directions looks the same
+_TRIG_STEPS = 256
+_COS = tuple(math.cos(2 * math.pi * i / _TRIG_STEPS) for i in range(_TRIG_STEPS))
+_SIN = tuple(math.sin(2 * math.pi * i / _TRIG_STEPS) for i in range(_TRIG_STEPS))
+
+# Color Palettes (Monochrome/Stealth with Dark Red Accents)
+# Format: (Primary, Secondary, Accent)
+# Primary: Dark Grey, Secondary: Black/Darker Grey, Accent: Dark Red/Silver
+PALETTES = {
+    "China": ("#525252", "#262626", "#7f1d1d"),      # Grey / Black / Dark Red
+    "Russia": ("#404040", "#171717", "#991b1b"),     # Darker Grey / Black / Red
+    "Iran": ("#525252", "#262626", "#7f1d1d"),       # Grey / Black / Dark Red
+    "North Korea": ("#404040", "#171717", "#991b1b"),# Darker Grey / Black / Red
+    "Vietnam": ("#525252", "#262626", "#7f1d1d"),    # Grey / Black / Dark Red
+    "Unknown": ("#404040", "#171717", "#7f1d1d")     # Darker Grey / Black / Dark Red
+}
+_COUNTRY_TO_PALETTE = {key.lower(): palette for key, palette in PALETTES.items()}
+
+def _lookup_palette(origins):
+    """
+    Pick the palette for an actor's origin countries.
+
+    Exact country names resolve with one dict lookup; longer names such as
+    "Russian Federation" fall back to matching a palette key as a substring.
+    """
+    for origin in origins:
+        if not isinstance(origin, str):
+            continue
+        palette = _COUNTRY_TO_PALETTE.get(origin.strip().lower())
+        if palette:
+            return palette
+        for key, palette in PALETTES.items():
+            if key in origin:
+                return palette
+    return PALETTES["Unknown"]
+
 def generate_actor_avatar(actor):
+    """
+    Get the avatar SVG for an actor, generating and caching it on first use.
+
+    Args:
+        actor: ThreatActor instance
+
+    Returns:
+        SVG markup as a string
+    """
+    # File names start with a hash of the actor id, so the previous avatar of a
+    # renamed or re-attributed actor can be found and removed
+    actor_key = hashlib.blake2b(actor.id.encode('utf-8'), digest_size=8).hexdigest()
+    key_str = f"{actor.id}-{actor.name}-{actor.origin_countries}"
+    key = hashlib.blake2b(key_str.encode('utf-8'), digest_size=16).hexdigest()
+    path = os.path.join(AVATAR_CACHE_DIR, f"{actor_key}-{key}.svg")
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        pass
+
+    svg = _build_avatar_svg(actor)
+
+    if not _stale_caches_pruned:
+        _prune_stale_caches()
+
+    # Write to a temp file and rename so concurrent workers never read a partial SVG
+    try:
+        os.makedirs(AVATAR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(svg)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[ERROR] Failed to cache avatar for {actor.id}: {e}")
+        return svg
+
+    # Drop this actor's avatars for its previous name or origin countries
+    for old_path in glob.glob(os.path.join(AVATAR_CACHE_DIR, f"{actor_key}-*.svg")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    return svg
+
+def _prune_stale_caches():
+    """Delete avatar caches of other AVATAR_VERSIONs and the legacy static/avatars directory."""
+    global _stale_caches_pruned
+    _stale_caches_pruned = True
+
+    stale_dirs = [_LEGACY_AVATAR_CACHE_DIR]
+    try:
+        stale_dirs += [os.path.join(_AVATAR_CACHE_ROOT, name) for name in os.listdir(_AVATAR_CACHE_ROOT)
+                       if name != f"v{AVATAR_VERSION}"]
+    except OSError:
+        pass  # No cache written yet
+
+    for stale_dir in stale_dirs:
+        shutil.rmtree(stale_dir, ignore_errors=True)
+
+def _build_avatar_svg(actor):
     """
     Generates a professional, abstract geometric 'fingerprint' avatar.
     Uses a monochrome/stealth palette for the enterprise theme.
     """
-    # 1. Deterministic Seed
+    # 1. Deterministic Seed (local RNG keeps concurrent requests independent)
     seed_str = f"{actor.id}-{actor.name}"
-    seed_int = int(hashlib.sha256(seed_str.encode('utf-8')).hexdigest(), 16)
-    random.seed(seed_int)
-
-    # 2. Color Palette (Monochrome/Stealth with Dark Red Accents)
-    # Format: (Primary, Secondary, Accent)
-    # Primary: Dark Grey, Secondary: Black/Darker Grey, Accent: Dark Red/Silver
-    palettes = {
-        "China": ("#525252", "#262626", "#7f1d1d"),      # Grey / Black / Dark Red
-        "Russia": ("#404040", "#171717", "#991b1b"),     # Darker Grey / Black / Red
-        "Iran": ("#525252", "#262626", "#7f1d1d"),       # Grey / Black / Dark Red
-        "North Korea": ("#404040", "#171717", "#991b1b"),# Darker Grey / Black / Red
-        "Vietnam": ("#525252", "#262626", "#7f1d1d"),    # Grey / Black / Dark Red
-        "Unknown": ("#404040", "#171717", "#7f1d1d")     # Darker Grey / Black / Dark Red
-    }
-    
+    seed_int = zlib.crc32(seed_str.encode('utf-8'))
+    rng = random.Random(seed_int)
+
+    # 2. Color Palette
     origins = []
     if actor.origin_countries:
-        try: origins = json.loads(actor.origin_countries)
+        try: origins = orjson.loads(actor.origin_countries)
         except: pass
-        
-    palette = palettes["Unknown"]
-    if origins:
-        for origin in origins:
-            for key in palettes:
-                if key in origin:
-                    palette = palettes[key]
-                    break
+
+    palette = _lookup_palette(origins)
     
     primary, secondary, light = palette
     
     # 3. Generate Abstract Shapes (The "Fingerprint")
-    svg_elements = []
-    
-    # Background - Dark Grey
-    svg_elements.append(f'<rect width="100%" height="100%" fill="#171717"/>')
-    
+    svg_elements = [_BACKGROUND]
+
     # Center point
-    cx, cy = 100, 100
+    cx, cy = _CX, _CY
     
     # Pattern Type determined by seed
     pattern_type = seed_int % 4
@@ -56,73 +178,55 @@ def generate_actor_avatar(actor):
         # Concentric Tech Rings
         for i in range(3, 0, -1):
             r = i * 25
-            dash = random.randint(10, 60)
-            stroke = random.choice([light, secondary])
-            width = random.randint(1, 4)
-            opacity = random.uniform(0.3, 0.8)
-            rotation = random.randint(0, 360)
-            svg_elements.append(f'''
-                <circle cx="{cx}" cy="{cy}" r="{r}" fill="none" stroke="{stroke}" stroke-width="{width}" 
-                stroke-dasharray="{dash} {dash/2}" opacity="{opacity}" transform="rotate({rotation} {cx} {cy})"/>
-            ''')
+            dash = rng.randint(10, 60)
+            stroke = rng.choice([light, secondary])
+            width = rng.randint(1, 4)
+            opacity = rng.uniform(0.3, 0.8)
+            rotation = rng.randint(0, 360)
+            svg_elements.append(_RING % (r, stroke, width, dash, dash / 2, opacity, rotation))
             
     elif pattern_type == 1:
         # Hexagonal Grid
-        size = 40
-        for i in range(3):
-            for j in range(3):
-                x = 40 + i * 60
-                y = 40 + j * 60
-                if random.random() > 0.4:
-                    color = random.choice([light, primary])
-                    opacity = random.uniform(0.2, 0.6)
-                    # Hexagon path
-                    svg_elements.append(f'''
-                        <path d="M{x} {y-20} L{x+17} {y-10} L{x+17} {y+10} L{x} {y+20} L{x-17} {y+10} L{x-17} {y-10} Z" 
-                        fill="{color}" opacity="{opacity}"/>
-                    ''')
+        for hex_path in _HEX_PATHS:
+            if rng.random() > 0.4:
+                color = rng.choice([light, primary])
+                opacity = rng.uniform(0.2, 0.6)
+                svg_elements.append(_HEXAGON % (hex_path, color, opacity))
 
     elif pattern_type == 2:
         # Data Nodes (Connected dots)
         points = []
         for _ in range(6):
-            angle = random.uniform(0, 2 * math.pi)
-            dist = random.uniform(20, 80)
-            px = cx + math.cos(angle) * dist
-            py = cy + math.sin(angle) * dist
+            step = rng.randrange(_TRIG_STEPS)
+            dist = rng.uniform(20, 80)
+            px = cx + _COS[step] * dist
+            py = cy + _SIN[step] * dist
             points.append((px, py))
             
         # Draw lines
         for i in range(len(points)):
             p1 = points[i]
             p2 = points[(i + 1) % len(points)]
-            svg_elements.append(f'<line x1="{p1[0]}" y1="{p1[1]}" x2="{p2[0]}" y2="{p2[1]}" stroke="{light}" stroke-width="1" opacity="0.4"/>')
+            svg_elements.append(_NODE_LINE % (p1[0], p1[1], p2[0], p2[1], light))
             
         # Draw dots
         for px, py in points:
-            svg_elements.append(f'<circle cx="{px}" cy="{py}" r="4" fill="{light}" opacity="0.8"/>')
+            svg_elements.append(_NODE_DOT % (px, py, light))
             
     else:
         # Abstract Glyphs
         for _ in range(4):
-            w = random.randint(20, 80)
-            h = random.randint(20, 80)
-            x = random.randint(20, 180-w)
-            y = random.randint(20, 180-h)
-            color = random.choice([light, primary])
-            svg_elements.append(f'<rect x="{x}" y="{y}" width="{w}" height="{h}" rx="2" fill="none" stroke="{color}" stroke-width="2" opacity="0.5" transform="rotate({random.randint(-45, 45)} {x+w/2} {y+h/2})"/>')
+            w = rng.randint(20, 80)
+            h = rng.randint(20, 80)
+            x = rng.randint(20, 180-w)
+            y = rng.randint(20, 180-h)
+            color = rng.choice([light, primary])
+            rotation = rng.randint(-45, 45)
+            svg_elements.append(_GLYPH % (x, y, w, h, color, rotation, x + w / 2, y + h / 2))
 
     # Overlay Initials
     initials = actor.name[:2].upper()
-    svg_elements.append(f'''
-        <text x="50%" y="50%" dy=".35em" text-anchor="middle" font-family="Arial, sans-serif" font-weight="bold" font-size="60" fill="{light}" opacity="0.1">{initials}</text>
-    ''')
+    svg_elements.append(_INITIALS % (light, initials))
 
     # Final SVG Assembly
-    svg_content = f'''
-    <svg width="200" height="200" viewBox="0 0 200 200" xmlns="http://www.w3.org/2000/svg">
-        {''.join(svg_elements)}
-    </svg>
-    '''
-    
-    return svg_content.strip()
+    return _SVG_OPEN + ''.join(svg_elements) + _SVG_CLOSE
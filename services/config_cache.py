@@ -0,0 +1,44 @@
+"""
+Process-level cache for the organization profile and trusted-domain settings.
+
+Both only change through the /settings forms, which call clear_config_cache()
+after committing, so read-only request paths can skip the database lookups.
+"""
+from collections import namedtuple
+from functools import lru_cache
+import orjson
+from models.models import OrganizationProfile, Settings
+
+# Read-only copy of OrganizationProfile (safe to use outside the request's session)
+ProfileSnapshot = namedtuple('ProfileSnapshot', ['name', 'sector', 'country'])
+
+@lru_cache(maxsize=1)
+def get_profile_cached():
+    """
+    Get the organization profile.
+
+    Returns:
+        ProfileSnapshot or None if no profile has been configured
+    """
+    profile = OrganizationProfile.query.first()
+    if not profile:
+        return None
+    return ProfileSnapshot(profile.name, profile.sector, profile.country)
+
+@lru_cache(maxsize=1)
+def get_trusted_domains_cached():
+    """
+    Get the configured trusted domains, parsed once.
+
+    Returns:
+        Tuple of domain strings in priority order
+    """
+    settings_obj = Settings.query.first()
+    if settings_obj and settings_obj.trusted_domains:
+        return tuple(orjson.loads(settings_obj.trusted_domains))
+    return ()
+
+def clear_config_cache():
+    """Drop cached profile/settings after they are modified."""
+    get_profile_cached.cache_clear()
+    get_trusted_domains_cached.cache_clear()
@@ -1,5 +1,6 @@
-import json
+import orjson
 import os
+import re
 import requests
 import urllib.parse
 from pathlib import Path
@@ -13,36 +14,39 @@ except ImportError:
 
 load_dotenv()
 
+# Short forms for overly formal ISO 3166 names
+_COUNTRY_OVERRIDES = {
+    'Korea, Democratic People\'s Republic of': 'North Korea',
+    'Korea, Republic of': 'South Korea',
+    'Iran, Islamic Republic of': 'Iran',
+    'Russian Federation': 'Russia',
+    'United States of America': 'United States',
+    'United Kingdom of Great Britain and Northern Ireland': 'United Kingdom',
+    'Viet Nam': 'Vietnam',
+    'Syrian Arab Republic': 'Syria',
+    'Palestine, State of': 'Palestine',
+    'Türkiye': 'Turkey'
+}
+
+# ISO alpha-2/alpha-3 code -> display name, with the overrides already applied
+_ISO_TO_NAME = {}
+if iso3166:
+    for _country in iso3166.countries:
+        _name = _COUNTRY_OVERRIDES.get(_country.name, _country.name)
+        _ISO_TO_NAME[_country.alpha2] = _name
+        _ISO_TO_NAME[_country.alpha3] = _name
+
 def get_country_name(country_code):
     """Convert ISO country code to human-readable name"""
-    if not country_code or not iso3166:
-        return country_code
-
-    try:
-        country = iso3166.countries.get(country_code.upper())
-        if not country:
-            return country_code
-
-        # Clean up overly formal names
-        name = country.name
-        name = name.replace('Korea, Democratic People\'s Republic of', 'North Korea')
-        name = name.replace('Korea, Republic of', 'South Korea')
-        name = name.replace('Iran, Islamic Republic of', 'Iran')
-        name = name.replace('Russian Federation', 'Russia')
-        name = name.replace('United States of America', 'United States')
-        name = name.replace('United Kingdom of Great Britain and Northern Ireland', 'United Kingdom')
-        name = name.replace('Viet Nam', 'Vietnam')
-        name = name.replace('Syrian Arab Republic', 'Syria')
-        name = name.replace('Palestine, State of', 'Palestine')
-        name = name.replace('Türkiye', 'Turkey')
-
-        return name
-    except (KeyError, AttributeError):
+    if not country_code:
         return country_code
+    return _ISO_TO_NAME.get(country_code.upper(), country_code)
 
 # Feedly API configuration
 FEEDLY_API_BASE = "https://api.feedly.com/v3"
 FEEDLY_API_TOKEN = os.getenv('FEEDLY_API_TOKEN', '').strip('\'"')  # Strip quotes
+# Built once; requests merges these into a new dict per call, so sharing is safe
+_AUTH_HEADERS = {'Authorization': f'Bearer {FEEDLY_API_TOKEN}'} if FEEDLY_API_TOKEN else None
 
 # Get reusable session with proxy support
 _session = get_global_session()
@@ -52,8 +56,8 @@ _FEEDLY_MAPPINGS = {}
 _mappings_file = Path(__file__).parent.parent / 'feedly_mappings.json'
 if _mappings_file.exists():
     try:
-        with open(_mappings_file, 'r') as f:
-            mapping_data = json.load(f)
+        with open(_mappings_file, 'rb') as f:
+            mapping_data = orjson.loads(f.read())
             _FEEDLY_MAPPINGS = mapping_data.get('mappings', {})
         print(f"[FEEDLY] Loaded {len(_FEEDLY_MAPPINGS)} manual actor mappings")
     except Exception as e:
@@ -68,6 +72,9 @@ def search_threat_actor_by_name(actor_name):
     2. Malpedia API UUID lookup (automatic for most actors)
     3. Return None if not found
 
+    Repeated lookups stay cheap without memoizing here: the Malpedia service
+    keeps resolved UUIDs, and only failed requests are retried.
+
     Args:
         actor_name: Name of the threat actor
 
@@ -98,28 +105,132 @@ def fetch_feedly_threat_actor(entity_id):
     Returns:
         Dictionary with threat actor data or None if not found
     """
-    if not FEEDLY_API_TOKEN:
+    return fetch_feedly_threat_actor_with_headers(entity_id)[0]
+
+def fetch_feedly_threat_actor_with_headers(entity_id, raise_on_rate_limit=False):
+    """
+    Fetch threat actor metadata like fetch_feedly_threat_actor(), also returning
+    the response headers so callers can pace themselves on Feedly's rate-limit headers.
+
+    Args:
+        entity_id: Feedly entity ID
+        raise_on_rate_limit: Re-raise the HTTPError for a final 429 so the
+            caller can stop, instead of returning (None, None)
+
+    Returns:
+        Tuple of (threat actor data or None, response headers or None)
+    """
+    if _AUTH_HEADERS is None:
         print("[ERROR] FEEDLY_API_TOKEN not set. Cannot fetch data.")
-        return None
+        return None, None
 
     # URL encode the entity ID
     encoded_id = urllib.parse.quote(entity_id, safe='')
     url = f"{FEEDLY_API_BASE}/entities/{encoded_id}"
 
-    headers = {
-        'Authorization': f'Bearer {FEEDLY_API_TOKEN}'
-    }
-
     # Use safe_get with retry logic and proxy support
-    response = safe_get(url, headers=headers, timeout=30, session=_session)
+    response = safe_get(url, headers=_AUTH_HEADERS, timeout=30, session=_session,
+                        raise_on_rate_limit=raise_on_rate_limit)
 
     if response:
         try:
-            return response.json()
+            return orjson.loads(response.content), response.headers
         except Exception as e:
             print(f"[FEEDLY] Error parsing JSON response for {entity_id}: {e}")
-            return None
-    return None
+            return None, response.headers
+    return None, None
+
+# Keyword mapping for sector inference: (sector, keywords) pairs
+_SECTOR_KEYWORDS = tuple((sector, frozenset(keywords)) for sector, keywords in {
+    'Financial Services': ['bank', 'finance', 'financial', 'exchange', 'crypto', 'currency', 'payment', 'swift'],
+    'Government': ['government', 'ministry', 'agency', 'embassy', 'diplomatic', 'election'],
+    'Defense': ['defense', 'military', 'army', 'navy', 'air force', 'weapon'],
+    'Energy': ['energy', 'power', 'oil', 'gas', 'electric', 'nuclear', 'utility'],
+    'Telecommunications': ['telecom', 'isp', 'mobile', 'carrier'],
+    'Healthcare': ['health', 'hospital', 'medical', 'pharmaceutical', 'vaccine'],
+    'Education': ['university', 'college', 'research', 'academic'],
+    'Technology': ['tech', 'software', 'it service', 'cyber', 'semiconductor'],
+    'Media & Entertainment': ['media', 'entertainment', 'pictures', 'studio', 'broadcasting', 'news'],
+    'Aerospace': ['aerospace', 'airline', 'aviation', 'space'],
+    'Manufacturing': ['manufacturing', 'industrial', 'factory'],
+    'Retail': ['retail', 'commerce', 'store']
+}.items())
+
+# Descriptions additionally map hospitality wording to Retail
+_DESCRIPTION_EXTRA_KEYWORDS = (
+    ('Retail', frozenset(['hospitality', 'restaurant'])),
+)
+
+def _build_sector_matcher(sector_keywords):
+    """
+    Compile a keyword table into a single-pass substring matcher.
+
+    Args:
+        sector_keywords: Iterable of (sector, lowercase keywords) pairs
+
+    Returns:
+        Tuple of (compiled pattern, dict of keyword -> frozenset of sectors)
+    """
+    keyword_sectors = {}
+    for sector, keywords in sector_keywords:
+        for keyword in keywords:
+            keyword_sectors.setdefault(keyword, set()).add(sector)
+
+    # Zero-width lookahead so matches may overlap; longest keywords are tried
+    # first, so the group found at a position is the longest keyword starting
+    # there. Every other keyword matching at that position is a prefix of it,
+    # so each keyword also carries the sectors of its keyword prefixes.
+    by_length = sorted(keyword_sectors, key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(re.escape(k) for k in by_length) + '))')
+    lookup = {
+        keyword: frozenset().union(*(sectors for prefix, sectors in keyword_sectors.items()
+                                     if keyword.startswith(prefix)))
+        for keyword in keyword_sectors
+    }
+    return pattern, lookup
+
+_TARGET_SECTOR_MATCHER = _build_sector_matcher(_SECTOR_KEYWORDS)
+_DESCRIPTION_SECTOR_MATCHER = _build_sector_matcher(_SECTOR_KEYWORDS + _DESCRIPTION_EXTRA_KEYWORDS)
+
+def _infer_sectors(text_lower, matcher):
+    """
+    Get every sector with a keyword occurring in the (lowercased) text.
+
+    Args:
+        text_lower: Lowercased text to scan
+        matcher: Result of _build_sector_matcher()
+
+    Returns:
+        Set of sector names
+    """
+    pattern, lookup = matcher
+    sectors = set()
+    for match in pattern.finditer(text_lower):
+        sectors |= lookup[match.group(1)]
+    return sectors
+
+def infer_sectors_batch(target_arrays):
+    """
+    Infer sectors for many actors' target lists at once.
+
+    Each actor's targets are lowercased and scanned as one newline-joined
+    string (no keyword contains a newline), so a batch costs one regex pass
+    per actor instead of one per target.
+
+    Args:
+        target_arrays: List of target-string lists, one per actor
+
+    Returns:
+        List of sector sets, in the same order as target_arrays
+    """
+    return [
+        _infer_sectors('\n'.join(targets).lower(), _TARGET_SECTOR_MATCHER) if targets else set()
+        for targets in target_arrays
+    ]
+
+# Words marking a Feedly target as an organization rather than a country
+_COMMON_ORGS = ('Bank', 'Pictures', 'Entertainment', 'exchanges', 'Exchange')
+_ORG_NAME_RE = re.compile('|'.join(re.escape(org) for org in _COMMON_ORGS))
 
 def parse_feedly_response(feedly_data):
     """
@@ -136,7 +247,30 @@ def parse_feedly_response(feedly_data):
 
     # Extract origin country from threatActorDetails
     origin_countries = []
-    threat_actor_details = feedly_data.get('threatActorDetails', {})
+    threat_actor_details = feedly_data.get('threatActorDetails') or {}
+
+    # Sparse entities carry no details at all: skip the per-field extraction.
+    # Only the description fallback can still yield anything.
+    if not threat_actor_details:
+        description = feedly_data.get('description', '')
+        victim_sectors = sorted(_infer_sectors(description.lower(), _DESCRIPTION_SECTOR_MATCHER)) if description else []
+        return {
+            "origin_country": "Unknown",
+            "victim_sectors": victim_sectors if victim_sectors else ["Unknown"],
+            "victim_countries": ["Unknown"],
+            "motivations": [],
+            "associated_malware": [],
+            "target_entities": [],
+            "popularity": feedly_data.get('popularity', 0),
+            "knowledge_base_url": feedly_data.get('knowledgeBaseUrl', ''),
+            "badges": feedly_data.get('badges', []),
+            "first_seen_at": feedly_data.get('firstSeenAt', ''),
+            "feedly_id": feedly_data.get('id', ''),
+            "description": description
+        }
+
+    # Get description from malpediaDescription or main description
+    description = threat_actor_details.get('malpediaDescription') or feedly_data.get('description', '')
 
     if 'country' in threat_actor_details and threat_actor_details['country']:
         # Country is ISO code (e.g., "KP" for North Korea, "CN" for China)
@@ -150,86 +284,26 @@ def parse_feedly_response(feedly_data):
     
     # Fallback: Infer sectors from targets if not provided
     if not victim_sectors and 'targets' in threat_actor_details:
-        targets_list = threat_actor_details.get('targets', [])
-        inferred_sectors = set()
-        
-        # Keyword mapping for sector inference
-        sector_keywords = {
-            'Financial Services': ['bank', 'finance', 'financial', 'exchange', 'crypto', 'currency', 'payment', 'swift'],
-            'Government': ['government', 'ministry', 'agency', 'embassy', 'diplomatic', 'election'],
-            'Defense': ['defense', 'military', 'army', 'navy', 'air force', 'weapon'],
-            'Energy': ['energy', 'power', 'oil', 'gas', 'electric', 'nuclear', 'utility'],
-            'Telecommunications': ['telecom', 'isp', 'mobile', 'carrier'],
-            'Healthcare': ['health', 'hospital', 'medical', 'pharmaceutical', 'vaccine'],
-            'Education': ['university', 'college', 'research', 'academic'],
-            'Technology': ['tech', 'software', 'it service', 'cyber', 'semiconductor'],
-            'Media & Entertainment': ['media', 'entertainment', 'pictures', 'studio', 'broadcasting', 'news'],
-            'Aerospace': ['aerospace', 'airline', 'aviation', 'space'],
-            'Manufacturing': ['manufacturing', 'industrial', 'factory'],
-            'Retail': ['retail', 'commerce', 'store']
-        }
-        
-        for target in targets_list:
-            target_lower = target.lower()
-            for sector, keywords in sector_keywords.items():
-                if any(k in target_lower for k in keywords):
-                    inferred_sectors.add(sector)
-        
-        if inferred_sectors:
-            victim_sectors = sorted(list(inferred_sectors))
+        # One scan over all targets; each sector is recorded once however many match
+        victim_sectors = sorted(infer_sectors_batch([threat_actor_details.get('targets') or ()])[0])
 
     # Fallback 2: Infer sectors from description if still unknown
-    description = threat_actor_details.get('malpediaDescription') or feedly_data.get('description', '')
     if not victim_sectors and description:
-        inferred_sectors = set()
-        desc_lower = description.lower()
-        
-        # Re-use sector keywords (defined above, but need to be accessible)
-        # We need to redefine or move the dictionary to a broader scope if we want to reuse it efficiently
-        # For now, I'll just use the same dictionary logic here
-        
-        sector_keywords = {
-            'Financial Services': ['bank', 'finance', 'financial', 'exchange', 'crypto', 'currency', 'payment', 'swift'],
-            'Government': ['government', 'ministry', 'agency', 'embassy', 'diplomatic', 'election'],
-            'Defense': ['defense', 'military', 'army', 'navy', 'air force', 'weapon'],
-            'Energy': ['energy', 'power', 'oil', 'gas', 'electric', 'nuclear', 'utility'],
-            'Telecommunications': ['telecom', 'isp', 'mobile', 'carrier'],
-            'Healthcare': ['health', 'hospital', 'medical', 'pharmaceutical', 'vaccine'],
-            'Education': ['university', 'college', 'research', 'academic'],
-            'Technology': ['tech', 'software', 'it service', 'cyber', 'semiconductor'],
-            'Media & Entertainment': ['media', 'entertainment', 'pictures', 'studio', 'broadcasting', 'news'],
-            'Aerospace': ['aerospace', 'airline', 'aviation', 'space'],
-            'Manufacturing': ['manufacturing', 'industrial', 'factory'],
-            'Retail': ['retail', 'commerce', 'store', 'hospitality', 'restaurant']
-        }
-        
-        for sector, keywords in sector_keywords.items():
-            if any(k in desc_lower for k in keywords):
-                inferred_sectors.add(sector)
-                
-        if inferred_sectors:
-            victim_sectors = sorted(list(inferred_sectors))
+        victim_sectors = sorted(_infer_sectors(description.lower(), _DESCRIPTION_SECTOR_MATCHER))
 
     # Extract victim countries - not directly available, use targets
-    victim_countries = []
     targets = threat_actor_details.get('targets', [])
     # Filter out organization names, keep country names
-    common_orgs = ['Bank', 'Pictures', 'Entertainment', 'exchanges', 'Exchange']
-    for target in targets:
-        if not any(org in target for org in common_orgs):
-            victim_countries.append(target)
+    victim_countries = [target for target in targets if not _ORG_NAME_RE.search(target)]
 
     # Extract motivations (array)
     motivations = threat_actor_details.get('motivations', [])
 
     # Extract associated malware
-    associated_malware = []
-    if 'associatedMalwares' in threat_actor_details:
-        for malware in threat_actor_details['associatedMalwares']:
-            associated_malware.append({
-                'id': malware.get('id', ''),
-                'label': malware.get('label', '')
-            })
+    associated_malware = [
+        {'id': malware.get('id', ''), 'label': malware.get('label', '')}
+        for malware in threat_actor_details.get('associatedMalwares') or ()
+    ]
 
     # Extract target entities (specific organizations/countries)
     target_entities = targets
@@ -241,9 +315,6 @@ def parse_feedly_response(feedly_data):
     first_seen_at = feedly_data.get('firstSeenAt', '')
     feedly_id = feedly_data.get('id', '')
 
-    # Get description from malpediaDescription or main description
-    description = threat_actor_details.get('malpediaDescription') or feedly_data.get('description', '')
-
     return {
         "origin_country": origin_countries[0] if origin_countries else "Unknown",
         "victim_sectors": victim_sectors if victim_sectors else ["Unknown"],
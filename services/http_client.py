@@ -3,7 +3,9 @@ Centralized HTTP client with proxy support, retry logic, and error handling.
 All API services should use this module for external requests.
 """
 import os
+import re
 import requests
+from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from dotenv import load_dotenv
@@ -17,16 +19,30 @@ load_dotenv()
 #   HTTPS_PROXY=http://proxy.company.com:8080
 #   NO_PROXY=localhost,127.0.0.1,.local
 
+# Control characters stripped from proxy URLs to prevent header injection
+_CRLF_RE = re.compile(r'[\r\n\x00-\x1f]')
+
+# Hosts never accepted as a proxy
+_BLOCKED_HOSTS = frozenset({'localhost', '127.0.0.1', '::1', '[::1]', '0.0.0.0'})
+
 def get_proxies():
     """
     Get proxy configuration from environment variables.
+    Computed once at import, since the environment doesn't change at runtime.
 
     Returns:
         dict: Proxy configuration for requests library
     """
-    from urllib.parse import urlparse
-    import re
+    return _CACHED_PROXIES
 
+
+def _compute_proxies():
+    """
+    Read and validate the proxy environment variables.
+
+    Returns:
+        dict: Proxy configuration for requests library (None if no proxy)
+    """
     proxies = {}
 
     http_proxy = os.getenv('HTTP_PROXY') or os.getenv('http_proxy')
@@ -34,7 +50,7 @@ def get_proxies():
 
     if http_proxy:
         # Sanitize CRLF characters to prevent header injection
-        http_proxy = re.sub(r'[\r\n\x00-\x1f]', '', http_proxy)
+        http_proxy = _CRLF_RE.sub('', http_proxy)
 
         # Validate proxy URL to prevent SSRF
         validated_proxy = validate_proxy_url(http_proxy)
@@ -46,7 +62,7 @@ def get_proxies():
 
     if https_proxy:
         # Sanitize CRLF characters to prevent header injection
-        https_proxy = re.sub(r'[\r\n\x00-\x1f]', '', https_proxy)
+        https_proxy = _CRLF_RE.sub('', https_proxy)
 
         # Validate proxy URL to prevent SSRF
         validated_proxy = validate_proxy_url(https_proxy)
@@ -69,8 +85,6 @@ def sanitize_url_for_logging(url):
     Returns:
         str: URL with credentials removed
     """
-    from urllib.parse import urlparse
-
     try:
         parsed = urlparse(url)
         # Reconstruct URL without credentials
@@ -95,7 +109,6 @@ def validate_proxy_url(url):
     Returns:
         str: Validated URL or None if invalid
     """
-    from urllib.parse import urlparse
     import ipaddress
 
     if not url:
@@ -110,8 +123,7 @@ def validate_proxy_url(url):
             return None
 
         # Block dangerous hostnames
-        blocked_hosts = ['localhost', '127.0.0.1', '::1', '[::1]', '0.0.0.0']
-        if parsed.hostname and parsed.hostname.lower() in blocked_hosts:
+        if parsed.hostname and parsed.hostname.lower() in _BLOCKED_HOSTS:
             print(f"[HTTP_CLIENT] WARNING: Blocked proxy host '{parsed.hostname}' - localhost not allowed")
             return None
 
@@ -135,11 +147,16 @@ def validate_proxy_url(url):
         return None
 
 
+_CACHED_PROXIES = _compute_proxies()
+
+
 def create_session_with_retries(
     max_retries=3,
     backoff_factor=0.5,
     status_forcelist=(500, 502, 503, 504, 429),
-    timeout=30
+    timeout=30,
+    pool_connections=32,
+    pool_maxsize=64
 ):
     """
     Create a requests Session with retry logic and proxy support.
@@ -149,6 +166,8 @@ def create_session_with_retries(
         backoff_factor: Backoff factor for exponential backoff (0.5 means 0.5s, 1s, 2s, ...)
         status_forcelist: HTTP status codes to retry on
         timeout: Default timeout for requests in seconds
+        pool_connections: Number of per-host connection pools to keep
+        pool_maxsize: Maximum connections kept per host (sized for concurrent enrichment workers)
 
     Returns:
         requests.Session: Configured session with retries and proxy
@@ -160,11 +179,22 @@ def create_session_with_retries(
         total=max_retries,
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
-        allowed_methods=["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"]
+        allowed_methods=["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"],
+        respect_retry_after_header=True,
+        # Hand the final response back so raise_for_status() reports the real
+        # status; safe_get/safe_post turn a final 429 into None unless the
+        # caller opts in with raise_on_rate_limit=True
+        raise_on_status=False
     )
 
-    # Mount adapter with retry strategy
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    # Mount adapter with retry strategy; the pool is large enough that threaded
+    # callers don't queue for a connection (pool_block=False never waits)
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=False
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
@@ -179,7 +209,7 @@ def create_session_with_retries(
     return session
 
 
-def safe_get(url, headers=None, timeout=30, session=None, **kwargs):
+def safe_get(url, headers=None, timeout=30, session=None, raise_on_rate_limit=False, **kwargs):
     """
     Perform a GET request with retry logic, proxy support, and error handling.
 
@@ -187,20 +217,23 @@ def safe_get(url, headers=None, timeout=30, session=None, **kwargs):
         url: URL to fetch
         headers: Optional headers dict
         timeout: Request timeout in seconds
-        session: Optional existing session (if None, creates new one)
+        session: Optional existing session (if None, uses the global session)
+        raise_on_rate_limit: Re-raise the HTTPError for a final 429 instead of
+            returning None, for callers that abort on rate limiting
         **kwargs: Additional arguments to pass to requests.get()
 
     Returns:
         requests.Response or None if error
     """
+    # Reuse pooled keep-alive connections instead of a fresh TLS handshake per call
     if session is None:
-        session = create_session_with_retries(timeout=timeout)
+        session = get_global_session()
 
     try:
         response = session.get(
             url,
             headers=headers,
-            timeout=kwargs.get('timeout', session.timeout),
+            timeout=timeout,
             **kwargs
         )
         response.raise_for_status()
@@ -216,8 +249,8 @@ def safe_get(url, headers=None, timeout=30, session=None, **kwargs):
         return None
     except requests.exceptions.HTTPError as e:
         print(f"[HTTP_CLIENT] HTTP error {e.response.status_code}: {url}")
-        # Re-raise 429 (rate limit) so caller can handle it
-        if e.response.status_code == 429:
+        # Re-raise 429 (rate limit) only for callers that handle it themselves
+        if raise_on_rate_limit and e.response.status_code == 429:
             raise
         return None
     except Exception as e:
@@ -225,7 +258,7 @@ def safe_get(url, headers=None, timeout=30, session=None, **kwargs):
         return None
 
 
-def safe_post(url, json_data=None, headers=None, timeout=30, session=None, **kwargs):
+def safe_post(url, json_data=None, headers=None, timeout=30, session=None, raise_on_rate_limit=False, **kwargs):
     """
     Perform a POST request with retry logic, proxy support, and error handling.
 
@@ -234,21 +267,24 @@ def safe_post(url, json_data=None, headers=None, timeout=30, session=None, **kwa
         json_data: JSON data to send
         headers: Optional headers dict
         timeout: Request timeout in seconds
-        session: Optional existing session (if None, creates new one)
+        session: Optional existing session (if None, uses the global session)
+        raise_on_rate_limit: Re-raise the HTTPError for a final 429 instead of
+            returning None, for callers that abort on rate limiting
         **kwargs: Additional arguments to pass to requests.post()
 
     Returns:
         requests.Response or None if error
     """
+    # Reuse pooled keep-alive connections instead of a fresh TLS handshake per call
     if session is None:
-        session = create_session_with_retries(timeout=timeout)
+        session = get_global_session()
 
     try:
         response = session.post(
             url,
             json=json_data,
             headers=headers,
-            timeout=kwargs.get('timeout', session.timeout),
+            timeout=timeout,
             **kwargs
         )
         response.raise_for_status()
@@ -264,8 +300,8 @@ def safe_post(url, json_data=None, headers=None, timeout=30, session=None, **kwa
         return None
     except requests.exceptions.HTTPError as e:
         print(f"[HTTP_CLIENT] HTTP error {e.response.status_code}: {url}")
-        # Re-raise 429 (rate limit) so caller can handle it
-        if e.response.status_code == 429:
+        # Re-raise 429 (rate limit) only for callers that handle it themselves
+        if raise_on_rate_limit and e.response.status_code == 429:
             raise
         return None
     except Exception as e:
@@ -288,3 +324,53 @@ def get_global_session():
     if _global_session is None:
         _global_session = create_session_with_retries()
     return _global_session
+
+
+def cached_get(url, cache_file, timeout=60, session=None):
+    """
+    GET a large, rarely changing document, revalidating a local copy with its ETag.
+
+    The body is kept in cache_file and the ETag in a sibling '.etag' file; when
+    the server answers 304 Not Modified the local copy is returned without
+    downloading it again.
+
+    Args:
+        url: URL to fetch
+        cache_file: pathlib.Path of the local copy
+        timeout: Request timeout in seconds
+        session: Optional existing session (if None, uses the global session)
+
+    Returns:
+        Response body as bytes, or None if it could not be fetched and no local copy exists
+    """
+    etag_file = cache_file.with_name(cache_file.name + '.etag')
+    headers = None
+    if cache_file.exists() and etag_file.exists():
+        headers = {'If-None-Match': etag_file.read_text(encoding='utf-8').strip()}
+
+    response = safe_get(url, headers=headers, timeout=timeout, session=session)
+
+    if response is None:
+        if cache_file.exists():
+            print(f"[HTTP_CLIENT] Using cached copy of {url}")
+            return cache_file.read_bytes()
+        return None
+
+    if response.status_code == 304:
+        print(f"[HTTP_CLIENT] Not modified, using cached copy of {url}")
+        return cache_file.read_bytes()
+
+    body = response.content
+    try:
+        # Write to a temp file and rename so a crash never leaves a torn cache
+        tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+        tmp_file.write_bytes(body)
+        os.replace(tmp_file, cache_file)
+        etag = response.headers.get('ETag')
+        if etag:
+            etag_file.write_text(etag, encoding='utf-8')
+        elif etag_file.exists():
+            etag_file.unlink()
+    except OSError as e:
+        print(f"[HTTP_CLIENT] Error caching {url}: {e}")
+    return body
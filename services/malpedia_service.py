@@ -1,20 +1,37 @@
 """
 Malpedia API service for mapping threat actor names to Feedly UUIDs
 """
-import json
+import atexit
+import orjson
+import os
+import threading
 from pathlib import Path
-from services.http_client import safe_get
+from services.http_client import safe_get, get_global_session
 
 MALPEDIA_API_BASE = "https://malpedia.caad.fkie.fraunhofer.de/api"
 
+# Get reusable session with proxy support
+_session = get_global_session()
+
 # Cache for Malpedia data
 _MALPEDIA_ACTORS = None
 _NAME_TO_SLUG = {}  # Maps actor name/synonym -> malpedia slug
 _SLUG_TO_UUID = {}  # Maps malpedia slug -> UUID
+_SLUGS_WITHOUT_UUID = set()  # Slugs whose details were fetched but carry no UUID
+
+# Resolved UUIDs are persisted so warm starts skip the per-actor detail calls.
+# New entries are flushed every _UUID_FLUSH_EVERY lookups and at exit.
+_UUID_CACHE_FILE = Path(__file__).parent.parent / 'malpedia_uuids.json'
+_UUID_FLUSH_EVERY = 20
+_unsaved_uuids = 0
+_mappings_lock = threading.Lock()  # first lookup may race between enrichment workers
+
+# Characters dropped by normalize_name, removed in a single translate() pass
+_NORMALIZE_TABLE = str.maketrans('', '', ' -_')
 
 def normalize_name(name):
     """Normalize actor name for comparison (lowercase, no spaces/special chars)."""
-    return name.lower().replace(' ', '').replace('-', '').replace('_', '')
+    return name.lower().translate(_NORMALIZE_TABLE)
 
 def load_malpedia_actors():
     """
@@ -32,8 +49,8 @@ def load_malpedia_actors():
     local_file = Path(__file__).parent.parent / 'malpedia_actors.json'
     if local_file.exists():
         try:
-            with open(local_file, 'r', encoding='utf-8') as f:
-                _MALPEDIA_ACTORS = json.load(f)
+            with open(local_file, 'rb') as f:
+                _MALPEDIA_ACTORS = orjson.loads(f.read())
                 print(f"[MALPEDIA] Loaded {len(_MALPEDIA_ACTORS)} actors from local cache")
                 return _MALPEDIA_ACTORS
         except Exception as e:
@@ -42,14 +59,14 @@ def load_malpedia_actors():
     # Fetch from API if local file doesn't exist
     try:
         print(f"[MALPEDIA] Fetching actor list from API...")
-        response = safe_get(f"{MALPEDIA_API_BASE}/list/actors", timeout=30)
+        response = safe_get(f"{MALPEDIA_API_BASE}/list/actors", timeout=30, session=_session)
         if not response:
             return []
-        _MALPEDIA_ACTORS = response.json()
+        _MALPEDIA_ACTORS = orjson.loads(response.content)
 
         # Save to local file for future use
-        with open(local_file, 'w', encoding='utf-8') as f:
-            json.dump(_MALPEDIA_ACTORS, f, indent=2)
+        with open(local_file, 'wb') as f:
+            f.write(orjson.dumps(_MALPEDIA_ACTORS, option=orjson.OPT_INDENT_2))
 
         print(f"[MALPEDIA] Fetched and cached {len(_MALPEDIA_ACTORS)} actors")
         return _MALPEDIA_ACTORS
@@ -68,14 +85,43 @@ def get_actor_details(actor_slug):
         Dictionary with actor details including UUID
     """
     try:
-        response = safe_get(f"{MALPEDIA_API_BASE}/get/actor/{actor_slug}", timeout=10)
+        response = safe_get(f"{MALPEDIA_API_BASE}/get/actor/{actor_slug}", timeout=10, session=_session)
         if not response:
             return None
-        return response.json()
+        return orjson.loads(response.content)
     except Exception as e:
         print(f"[MALPEDIA] Error fetching details for '{actor_slug}': {e}")
         return None
 
+def load_uuid_cache():
+    """Load previously resolved slug -> UUID mappings from disk."""
+    if not _UUID_CACHE_FILE.exists():
+        return
+    try:
+        with open(_UUID_CACHE_FILE, 'rb') as f:
+            _SLUG_TO_UUID.update(orjson.loads(f.read()))
+        print(f"[MALPEDIA] Loaded {len(_SLUG_TO_UUID)} cached UUIDs")
+    except Exception as e:
+        print(f"[MALPEDIA] Error loading UUID cache: {e}")
+
+def save_uuid_cache():
+    """Write the slug -> UUID mappings to disk if there are unsaved entries."""
+    global _unsaved_uuids
+
+    if not _unsaved_uuids:
+        return
+    try:
+        # Write to a temp file and rename so a crash never leaves a torn cache
+        tmp_file = _UUID_CACHE_FILE.with_suffix('.json.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(_SLUG_TO_UUID))
+        os.replace(tmp_file, _UUID_CACHE_FILE)
+        _unsaved_uuids = 0
+    except Exception as e:
+        print(f"[MALPEDIA] Error saving UUID cache: {e}")
+
+atexit.register(save_uuid_cache)
+
 def build_name_mappings():
     """
     Build mappings from actor names/synonyms to Malpedia slugs and UUIDs.
@@ -83,31 +129,46 @@ def build_name_mappings():
     """
     global _NAME_TO_SLUG, _SLUG_TO_UUID
 
-    if _NAME_TO_SLUG:
-        return  # Already built
+    with _mappings_lock:
+        if _NAME_TO_SLUG:
+            return  # Already built
 
-    actors = load_malpedia_actors()
-    if not actors:
-        return
+        actors = load_malpedia_actors()
+        if not actors:
+            return
+
+        print(f"[MALPEDIA] Building name mappings for {len(actors)} actors...")
 
-    print(f"[MALPEDIA] Building name mappings for {len(actors)} actors...")
+        # For efficiency, we'll just map the slug names directly
+        # and load details on-demand when needed. normalize_name drops both '_'
+        # and ' ', so one key covers the slug ("lazarus_group") and its readable
+        # form ("lazarus group") alike.
+        mappings = {}
+        for actor_slug in actors:
+            mappings[normalize_name(actor_slug)] = actor_slug
 
-    # For efficiency, we'll just map the slug names directly
-    # and load details on-demand when needed
-    for actor_slug in actors:
-        # Map the slug itself (e.g., "lazarus_group" -> "lazarus_group")
-        _NAME_TO_SLUG[normalize_name(actor_slug)] = actor_slug
+        # Publish the finished dict so lock-free readers never see a partial one
+        _NAME_TO_SLUG = mappings
+        print(f"[MALPEDIA] Built {len(_NAME_TO_SLUG)} name mappings")
 
-        # Also map with spaces (e.g., "lazarus group" -> "lazarus_group")
-        readable_name = actor_slug.replace('_', ' ')
-        _NAME_TO_SLUG[normalize_name(readable_name)] = actor_slug
+def _remember_uuid(actor_slug, uuid):
+    """Cache a resolved UUID and periodically persist the cache."""
+    global _unsaved_uuids
 
-    print(f"[MALPEDIA] Built {len(_NAME_TO_SLUG)} name mappings")
+    _SLUG_TO_UUID[actor_slug] = uuid
+    _unsaved_uuids += 1
+    if _unsaved_uuids >= _UUID_FLUSH_EVERY:
+        save_uuid_cache()
 
 def get_uuid_for_actor(actor_name):
     """
     Get the Malpedia UUID for a threat actor by name.
 
+    Only definite answers are remembered: resolved UUIDs (_SLUG_TO_UUID) and
+    actors whose details carry no UUID (_SLUGS_WITHOUT_UUID). Names without a
+    slug are a plain dict miss, and failed detail requests are retried on the
+    next lookup.
+
     Args:
         actor_name: Name of the threat actor
 
@@ -127,19 +188,26 @@ def get_uuid_for_actor(actor_name):
     # Check if we already have the UUID cached
     if actor_slug in _SLUG_TO_UUID:
         return _SLUG_TO_UUID[actor_slug]
+    if actor_slug in _SLUGS_WITHOUT_UUID:
+        return None
 
     # Fetch details from API to get UUID
     details = get_actor_details(actor_slug)
     if not details:
-        return None
+        return None  # request failed; not cached, so the next lookup retries
 
     uuid = details.get('uuid')
     if uuid:
-        _SLUG_TO_UUID[actor_slug] = uuid
+        _remember_uuid(actor_slug, uuid)
         return uuid
 
+    _SLUGS_WITHOUT_UUID.add(actor_slug)
     return None
 
+def clear_lookup_cache():
+    """Forget actors known to have no UUID, so they are looked up again."""
+    _SLUGS_WITHOUT_UUID.clear()
+
 def get_feedly_entity_id(actor_name):
     """
     Get the Feedly entity ID for a threat actor using Malpedia UUID.
@@ -159,5 +227,6 @@ def get_feedly_entity_id(actor_name):
     # Construct Feedly entity ID
     return f"nlp/f/entity/gz:ta:{uuid}"
 
-# Initialize mappings on module load
-build_name_mappings()
+# Name mappings are built lazily on the first lookup; only the UUID cache
+# (a local file read) is loaded on import
+load_uuid_cache()
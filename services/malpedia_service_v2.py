@@ -2,8 +2,9 @@
 Malpedia API service - Single API call approach
 Fetches ALL actors in one call from /api/get/actors endpoint
 """
+import orjson
 import requests
-import json
+from functools import lru_cache
 from pathlib import Path
 from services.http_client import safe_get, get_global_session
 
@@ -14,6 +15,7 @@ _session = get_global_session()
 
 # Cache for all actor data
 _ALL_ACTORS_DATA = None
+_NAME_INDEX = None  # Maps normalized value/synonym -> actor data, built on first lookup
 
 def fetch_all_actors():
     """
@@ -31,10 +33,9 @@ def fetch_all_actors():
     cache_file = Path(__file__).parent.parent / 'malpedia_all_actors.json'
     if cache_file.exists():
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                _ALL_ACTORS_DATA = json.load(f)
-                print(f"[MALPEDIA] Loaded {len(_ALL_ACTORS_DATA)} actors from local cache")
-                return _ALL_ACTORS_DATA
+            _ALL_ACTORS_DATA = orjson.loads(cache_file.read_bytes())
+            print(f"[MALPEDIA] Loaded {len(_ALL_ACTORS_DATA)} actors from local cache")
+            return _ALL_ACTORS_DATA
         except Exception as e:
             print(f"[MALPEDIA] Error loading cache: {e}")
 
@@ -44,11 +45,11 @@ def fetch_all_actors():
 
     if response:
         try:
-            _ALL_ACTORS_DATA = response.json()
+            _ALL_ACTORS_DATA = orjson.loads(response.content)
 
             # Save to cache
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(_ALL_ACTORS_DATA, f, indent=2)
+            # Compact: the cache is only read back by this module
+            cache_file.write_bytes(orjson.dumps(_ALL_ACTORS_DATA))
 
             print(f"[MALPEDIA] SUCCESS! Fetched {len(_ALL_ACTORS_DATA)} actors in ONE call")
             return _ALL_ACTORS_DATA
@@ -59,9 +60,33 @@ def fetch_all_actors():
         print(f"[MALPEDIA] ERROR fetching actors (check proxy settings if configured)")
         return {}
 
+# Characters dropped by normalize_name, removed in a single translate() pass
+_NORMALIZE_TABLE = str.maketrans('', '', ' _-')
+
+@lru_cache(maxsize=65536)
 def normalize_name(name):
     """Normalize name for matching (lowercase, no spaces/underscores/hyphens)."""
-    return name.lower().replace(' ', '').replace('_', '').replace('-', '')
+    return name.lower().translate(_NORMALIZE_TABLE)
+
+def _build_name_index(all_actors):
+    """
+    Index every actor under its normalized value and synonyms.
+
+    Args:
+        all_actors: Dictionary from fetch_all_actors()
+
+    Returns:
+        Dictionary mapping normalized names to actor data
+    """
+    index = {}
+    # setdefault keeps the first actor per name, in the same order a linear
+    # scan over values and synonyms would find it
+    for actor_data in all_actors.values():
+        if 'value' in actor_data:
+            index.setdefault(normalize_name(actor_data['value']), actor_data)
+        for synonym in actor_data.get('meta', {}).get('synonyms', ()):
+            index.setdefault(normalize_name(synonym), actor_data)
+    return index
 
 def find_actor_by_name(actor_name):
     """
@@ -73,26 +98,27 @@ def find_actor_by_name(actor_name):
     Returns:
         Actor data dict with 'uuid' and 'value', or None if not found
     """
-    all_actors = fetch_all_actors()
-    if not all_actors:
-        return None
+    return find_actor_by_normalized(normalize_name(actor_name))
 
-    normalized_search = normalize_name(actor_name)
+def find_actor_by_normalized(normalized_name):
+    """
+    Find an actor by a name already passed through normalize_name().
 
-    # Search through all actors
-    for actor_slug, actor_data in all_actors.items():
-        # Check the value field
-        if 'value' in actor_data:
-            if normalize_name(actor_data['value']) == normalized_search:
-                return actor_data
+    Args:
+        normalized_name: Normalized actor name or synonym
 
-        # Check synonyms in meta
-        if 'meta' in actor_data and 'synonyms' in actor_data['meta']:
-            for synonym in actor_data['meta']['synonyms']:
-                if normalize_name(synonym) == normalized_search:
-                    return actor_data
+    Returns:
+        Actor data dict with 'uuid' and 'value', or None if not found
+    """
+    global _NAME_INDEX
 
-    return None
+    if _NAME_INDEX is None:
+        all_actors = fetch_all_actors()
+        if not all_actors:
+            return None
+        _NAME_INDEX = _build_name_index(all_actors)
+
+    return _NAME_INDEX.get(normalized_name)
 
 def get_uuid_for_actor(actor_name):
     """
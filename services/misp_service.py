@@ -1,16 +1,21 @@
 """
 MISP Galaxy service for mapping threat actor names to UUIDs
 """
-import json
+import orjson
+import threading
 from pathlib import Path
-from services.http_client import safe_get
+from services.http_client import safe_get, get_global_session
 
 MISP_INTRUSION_SET_URL = "https://raw.githubusercontent.com/MISP/misp-galaxy/main/clusters/mitre-intrusion-set.json"
 
+# Get reusable session with proxy support
+_session = get_global_session()
+
 # Cache for MISP data
 _MISP_DATA = None
 _MISP_UUID_MAP = {}  # Maps actor name -> UUID
 _MISP_SYNONYM_MAP = {}  # Maps synonym -> canonical name
+_mappings_lock = threading.Lock()  # the lazy first build may race between threads
 
 def load_misp_data():
     """
@@ -28,24 +33,23 @@ def load_misp_data():
     local_file = Path(__file__).parent.parent / 'misp_intrusion_set.json'
     if local_file.exists():
         try:
-            with open(local_file, 'r', encoding='utf-8') as f:
-                _MISP_DATA = json.load(f)
-                print(f"[MISP] Loaded data from local file: {len(_MISP_DATA.get('values', []))} actors")
-                return _MISP_DATA
+            _MISP_DATA = orjson.loads(local_file.read_bytes())
+            print(f"[MISP] Loaded data from local file: {len(_MISP_DATA.get('values', []))} actors")
+            return _MISP_DATA
         except Exception as e:
             print(f"[MISP] Error loading local file: {e}")
 
     # Fetch from GitHub if local file doesn't exist
     try:
         print(f"[MISP] Fetching data from {MISP_INTRUSION_SET_URL}...")
-        response = safe_get(MISP_INTRUSION_SET_URL, timeout=30)
+        response = safe_get(MISP_INTRUSION_SET_URL, timeout=30, session=_session)
         if not response:
             return None
-        _MISP_DATA = response.json()
+        _MISP_DATA = orjson.loads(response.content)
 
         # Save to local file for future use
-        with open(local_file, 'w', encoding='utf-8') as f:
-            json.dump(_MISP_DATA, f, indent=2)
+        # Compact: the cache is only read back by this module
+        local_file.write_bytes(orjson.dumps(_MISP_DATA))
 
         print(f"[MISP] Fetched and cached {len(_MISP_DATA.get('values', []))} actors")
         return _MISP_DATA
@@ -59,34 +63,40 @@ def build_uuid_mappings():
     """
     global _MISP_UUID_MAP, _MISP_SYNONYM_MAP
 
-    if _MISP_UUID_MAP:
-        return  # Already built
+    with _mappings_lock:
+        if _MISP_UUID_MAP:
+            return  # Already built
 
-    data = load_misp_data()
-    if not data:
-        return
+        data = load_misp_data()
+        if not data:
+            return
 
-    for actor in data.get('values', []):
-        uuid = actor.get('uuid')
-        value = actor.get('value', '')
+        uuid_map = {}
+        synonym_map = {}
+        for actor in data.get('values', []):
+            uuid = actor.get('uuid')
+            value = actor.get('value', '')
 
-        if not uuid or not value:
-            continue
+            if not uuid or not value:
+                continue
 
-        # Extract canonical name from value (e.g., "Lazarus Group - G0032" -> "Lazarus Group")
-        canonical_name = value.split(' - ')[0].strip()
+            # Extract canonical name from value (e.g., "Lazarus Group - G0032" -> "Lazarus Group")
+            canonical_name = value.partition(' - ')[0].strip()
 
-        # Map canonical name to UUID
-        _MISP_UUID_MAP[canonical_name] = uuid
+            # Map canonical name to UUID
+            uuid_map[canonical_name] = uuid
 
-        # Map all synonyms to canonical name
-        synonyms = actor.get('meta', {}).get('synonyms', [])
-        for synonym in synonyms:
-            _MISP_SYNONYM_MAP[synonym] = canonical_name
-            # Also map synonym directly to UUID
-            _MISP_UUID_MAP[synonym] = uuid
+            # Map all synonyms to canonical name
+            synonyms = actor.get('meta', {}).get('synonyms', [])
+            for synonym in synonyms:
+                synonym_map[synonym] = canonical_name
+                # Also map synonym directly to UUID
+                uuid_map[synonym] = uuid
 
-    print(f"[MISP] Built UUID mappings: {len(_MISP_UUID_MAP)} names, {len(_MISP_SYNONYM_MAP)} synonyms")
+        # Publish the finished dicts so lock-free readers never see partial ones
+        _MISP_SYNONYM_MAP = synonym_map
+        _MISP_UUID_MAP = uuid_map
+        print(f"[MISP] Built UUID mappings: {len(_MISP_UUID_MAP)} names, {len(_MISP_SYNONYM_MAP)} synonyms")
 
 def get_uuid_for_actor(actor_name):
     """
@@ -132,5 +142,4 @@ def get_feedly_entity_id(actor_name):
     # Construct Feedly entity ID
     return f"nlp/f/entity/gz:ta:{uuid}"
 
-# Initialize mappings on module load
-build_uuid_mappings()
+# Mappings are built lazily on the first lookup, keeping network I/O off the import path
@@ -1,22 +1,194 @@
 import requests
-import json
+import orjson
 import os
+import sys
+import threading
 import time
 import urllib.parse
-from models.models import db, ThreatActor, TTP, actor_ttp, Changelog
-from services.malpedia_service_v2 import fetch_all_actors, get_uuid_for_actor, find_actor_by_name
-from services.feedly_service import fetch_feedly_threat_actor, parse_feedly_response
-from services.http_client import safe_get, get_global_session
+from concurrent.futures import ThreadPoolExecutor
+from models.models import db, ThreatActor, TTP, actor_ttp, Changelog, build_search_keys
+from services.malpedia_service_v2 import fetch_all_actors, get_uuid_for_actor, find_actor_by_normalized, normalize_name
+from services.feedly_service import fetch_feedly_threat_actor_with_headers, parse_feedly_response
+from pathlib import Path
+from services.http_client import cached_get, get_global_session
 
 MITRE_URL = "https://raw.githubusercontent.com/mitre-attack/attack-stix-data/refs/heads/master/enterprise-attack/enterprise-attack.json"
+# Local copy of the bundle, revalidated with its ETag on every run
+MITRE_CACHE_FILE = Path(__file__).parent.parent / 'mitre_enterprise_attack.json'
 
 # Get reusable session with proxy support
 _session = get_global_session()
 
+# JSON text columns are encoded with orjson (compact separators, UTF-8)
+_dumps = lambda o: orjson.dumps(o).decode()
+# Columns drawn from a small vocabulary (tactics, countries, sectors, ...) encode
+# to the same few strings across hundreds of rows; interning keeps one copy each
+_dumps_interned = lambda o: sys.intern(_dumps(o))
+
 # CONFIGURABLE LIMITS
 # 0 means unlimited - enrich all actors
 MAX_ACTORS_TO_ENRICH = int(os.getenv('MAX_ACTORS_TO_ENRICH', '0'))  # Default: 0 (all actors)
-DELAY_BETWEEN_FEEDLY_CALLS = 2  # seconds
+DELAY_BETWEEN_FEEDLY_CALLS = 2  # seconds between Feedly calls when no rate-limit headers are sent
+FEEDLY_RATE_LIMIT_LOW_WATER = 5  # remaining calls at which to wait for the rate-limit reset
+
+# Feedly responses are kept on disk per Malpedia UUID so re-runs skip the API;
+# FEEDLY_FORCE_REFRESH=1 ignores the cached copies
+FEEDLY_CACHE_DIR = Path(__file__).parent.parent / 'cache' / 'feedly'
+FEEDLY_CACHE_TTL_HOURS = float(os.getenv('FEEDLY_CACHE_TTL_HOURS', '24'))
+FEEDLY_FORCE_REFRESH = os.getenv('FEEDLY_FORCE_REFRESH', '').lower() in ('1', 'true', 'yes')
+FEEDLY_WORKERS = 4  # Feedly calls allowed in flight at once
+
+# ThreatActor fields compared (and changelogged) when re-ingesting an actor
+TRACKED_ACTOR_FIELDS = (
+    'name', 'description', 'aliases', 'origin_countries',
+    'victim_sectors', 'victim_countries', 'motivation',
+    'motivations', 'associated_malware', 'target_entities',
+    'popularity', 'knowledge_base_url', 'badges',
+    'first_seen_at', 'feedly_id', 'attribution_confidence',
+    'type_of_incident', 'actor_references', 'related_actors'
+)
+_TRACKED_ACTOR_COLUMNS = tuple(getattr(ThreatActor, field) for field in TRACKED_ACTOR_FIELDS)
+
+# Tracked fields holding JSON text; these are compared by value, so rows
+# encoded with different whitespace/escaping are not logged as changed
+_JSON_ACTOR_FIELDS = frozenset((
+    'aliases', 'origin_countries', 'victim_sectors', 'victim_countries',
+    'motivations', 'associated_malware', 'target_entities', 'badges',
+    'type_of_incident', 'actor_references', 'related_actors'
+))
+
+def _field_changed(field, old_val, new_val):
+    """
+    Check whether a re-ingested actor field differs from the stored value.
+
+    Args:
+        field: Name of the tracked ThreatActor field
+        old_val: Value currently stored
+        new_val: Freshly ingested value
+
+    Returns:
+        True if the field should be updated and changelogged
+    """
+    if old_val == new_val:
+        return False
+    if field in _JSON_ACTOR_FIELDS and old_val and new_val:
+        try:
+            return orjson.loads(old_val) != orjson.loads(new_val)
+        except orjson.JSONDecodeError:
+            return True
+    return True
+
+# Start time reserved for the next Feedly call and the spacing between calls,
+# shared by the enrichment workers. The spacing drops to zero once Feedly
+# reports its remaining quota, and calls then only wait when it runs low.
+_feedly_pace_lock = threading.Lock()
+_next_feedly_call = 0.0
+_feedly_call_interval = DELAY_BETWEEN_FEEDLY_CALLS
+
+def _update_feedly_pace(headers):
+    """
+    Adjust the Feedly call pacing from a response's rate-limit headers.
+
+    Args:
+        headers: Response headers, or None if no response was received
+    """
+    global _next_feedly_call, _feedly_call_interval
+
+    remaining = headers.get('X-RateLimit-Remaining') if headers else None
+    try:
+        remaining = int(remaining)
+    except (TypeError, ValueError):
+        # No usable header: fall back to the fixed delay
+        with _feedly_pace_lock:
+            _feedly_call_interval = DELAY_BETWEEN_FEEDLY_CALLS
+        return
+
+    with _feedly_pace_lock:
+        _feedly_call_interval = 0
+        if remaining < FEEDLY_RATE_LIMIT_LOW_WATER:
+            try:
+                reset = float(headers.get('X-RateLimit-Reset', DELAY_BETWEEN_FEEDLY_CALLS))
+            except ValueError:
+                reset = DELAY_BETWEEN_FEEDLY_CALLS
+            # The reset may be sent as an epoch timestamp or as seconds to wait
+            if reset > 1e9:
+                reset -= time.time()
+            print(f"  [RATE LIMIT] {remaining} Feedly calls left, pausing {max(reset, 0):.0f}s")
+            _next_feedly_call = max(_next_feedly_call, time.monotonic() + max(reset, 0))
+
+def _load_cached_feedly(uuid):
+    """
+    Get a Feedly response cached on disk for this UUID, if still fresh.
+
+    Args:
+        uuid: Malpedia UUID of the actor
+
+    Returns:
+        Feedly data or None if not cached, expired or refresh is forced
+    """
+    if FEEDLY_FORCE_REFRESH:
+        return None
+    cache_file = FEEDLY_CACHE_DIR / f"{uuid}.json"
+    try:
+        if time.time() - cache_file.stat().st_mtime > FEEDLY_CACHE_TTL_HOURS * 3600:
+            return None
+        return orjson.loads(cache_file.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _save_cached_feedly(uuid, feedly_data):
+    """Write a Feedly response to the disk cache (atomically; errors are only logged)."""
+    cache_file = FEEDLY_CACHE_DIR / f"{uuid}.json"
+    try:
+        FEEDLY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+        tmp_file.write_bytes(orjson.dumps(feedly_data))
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"  [WARNING] Could not cache Feedly response: {e}")
+
+def _fetch_feedly_paced(uuid, stop_event):
+    """
+    Fetch a Feedly entity from the disk cache, or from the API once its
+    rate-limit slot comes up.
+
+    Args:
+        uuid: Malpedia UUID of the actor (Feedly entity nlp/f/entity/gz:ta:{uuid})
+        stop_event: threading.Event set when enrichment is aborted
+
+    Returns:
+        Tuple of (whether the API was called, Feedly data or None)
+    """
+    global _next_feedly_call
+
+    if stop_event.is_set():
+        return False, None
+
+    feedly_data = _load_cached_feedly(uuid)
+    if feedly_data is not None:
+        return False, feedly_data
+
+    with _feedly_pace_lock:
+        now = time.monotonic()
+        wait = _next_feedly_call - now
+        _next_feedly_call = max(now, _next_feedly_call) + _feedly_call_interval
+    if wait > 0:
+        time.sleep(wait)
+
+    if stop_event.is_set():
+        return False, None
+
+    try:
+        feedly_data, headers = fetch_feedly_threat_actor_with_headers(f"nlp/f/entity/gz:ta:{uuid}",
+                                                                      raise_on_rate_limit=True)
+        _update_feedly_pace(headers)
+        if feedly_data is not None:
+            _save_cached_feedly(uuid, feedly_data)
+        return True, feedly_data
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 429:
+            stop_event.set()
+        raise
 
 def fetch_and_parse_mitre_data():
     """
@@ -47,20 +219,24 @@ def fetch_and_parse_mitre_data():
 
     # STEP 2: Fetch MITRE data with proxy support
     print(f"[2/4] Fetching MITRE ATT&CK data from {MITRE_URL}...")
-    response = safe_get(MITRE_URL, timeout=60, session=_session)
+    body = cached_get(MITRE_URL, MITRE_CACHE_FILE, timeout=60, session=_session)
 
-    if response:
+    if body:
         try:
-            data = response.json()
+            data = orjson.loads(body)
             print(f"[SUCCESS] Got MITRE data")
         except Exception as e:
             print(f"[ERROR] Failed to parse MITRE data: {e}")
             return
+        finally:
+            # Drop the raw body (tens of MB) now rather than at function exit
+            del body
     else:
         print(f"[ERROR] Failed to fetch MITRE data (check proxy settings if configured)")
         return
 
-    objects = data.get("objects", [])
+    objects = data.pop("objects", [])
+    del data
     print(f"[INFO] Processing {len(objects)} MITRE objects...")
     print()
 
@@ -69,9 +245,8 @@ def fetch_and_parse_mitre_data():
     print(f"[3/4] Enriching actors with Feedly (LIMIT: {limit_msg})...")
     print()
 
-    actors = {}
-    ttps = {}
-    relationships = []
+    actors = {}  # actor_id -> ThreatActor column values
+    ttps = {}  # ttp_id -> TTP column values
 
     # Track statistics
     total_mitre_actors = 0
@@ -81,237 +256,297 @@ def fetch_and_parse_mitre_data():
     actors_skipped_limit_reached = 0
     rate_limit_hit = False
 
+    # Bucket objects by type in one pass so the CPU-only TTP extraction runs
+    # before the rate-limited Feedly loop over intrusion sets. Only the three
+    # types used below are kept; the rest of the bundle is freed right away,
+    # before the long enrichment loop.
+    by_type = {"intrusion-set": [], "attack-pattern": [], "relationship": []}
     for obj in objects:
-        obj_type = obj.get("type")
-
-        if obj_type == "intrusion-set":
-            # Threat Actor
-            total_mitre_actors += 1
-            actor_id = obj.get("id")
-            name = obj.get("name")
-            description = obj.get("description", "")
-            aliases = obj.get("aliases", [])
-            motivation = obj.get("primary_motivation", "Unknown")
-
-            # Check if we've reached the limit (0 means unlimited)
-            if MAX_ACTORS_TO_ENRICH > 0 and feedly_calls_made >= MAX_ACTORS_TO_ENRICH:
-                actors_skipped_limit_reached += 1
-                continue
-
-            # Get full Malpedia data
-            malpedia_data = find_actor_by_name(name)
+        bucket = by_type.get(obj.get("type"))
+        if bucket is not None:
+            bucket.append(obj)
+    del objects
+    intrusion_sets = by_type["intrusion-set"]
+    attack_patterns = by_type["attack-pattern"]
+    # Only the endpoints of relationships are needed for TTP linking
+    relationships = [(rel.get("source_ref"), rel.get("target_ref")) for rel in by_type.pop("relationship")]
+    print(f"[INFO] {len(intrusion_sets)} intrusion sets, {len(attack_patterns)} techniques, {len(relationships)} relationships")
+
+    for obj in attack_patterns:
+        # TTP
+        ttp_id = obj.get("id")
+        name = obj.get("name")
+        description = obj.get("description", "")
+
+        # Extract MITRE ID
+        mitre_id = None
+        for ref in obj.get("external_references", []):
+            if ref.get("source_name") == "mitre-attack":
+                mitre_id = ref.get("external_id")
+                break
+
+        # Extract Tactics
+        tactics = []
+        for phase in obj.get("kill_chain_phases", []):
+            if phase.get("kill_chain_name") == "mitre-attack":
+                tactics.append(phase.get("phase_name"))
+
+        ttps[ttp_id] = dict(
+            id=ttp_id,
+            mitre_id=mitre_id,
+            name=name,
+            description=description,
+            tactics=_dumps_interned(tactics)
+        )
+
+    # Resolve every intrusion set against Malpedia up front, falling back to
+    # its MITRE aliases when the canonical name has no match. Each name is
+    # normalized once, and since the aliases usually repeat the name,
+    # duplicates are dropped before probing the index.
+    malpedia_matches = {}
+    for obj in intrusion_sets:
+        candidates = dict.fromkeys(
+            normalize_name(candidate) for candidate in (obj.get("name"), *obj.get("aliases", [])) if candidate
+        )
+        for candidate in candidates:
+            malpedia_data = find_actor_by_normalized(candidate)
+            if malpedia_data:
+                malpedia_matches[obj.get("id")] = malpedia_data
+                break
+
+    # Select the actors to enrich (limit and Malpedia match) on this thread
+    tasks = []
+    skip_lines = []
+    for obj in intrusion_sets:
+        # Threat Actor
+        total_mitre_actors += 1
+        name = obj.get("name")
+
+        # Check if we've reached the limit (0 means unlimited)
+        if MAX_ACTORS_TO_ENRICH > 0 and len(tasks) >= MAX_ACTORS_TO_ENRICH:
+            actors_skipped_limit_reached += 1
+            continue
+
+        # Get full Malpedia data
+        malpedia_data = malpedia_matches.get(obj.get("id"))
+
+        if not malpedia_data:
+            actors_skipped_not_in_malpedia += 1
+            skip_lines.append(f"[SKIP] '{name}' - Not in Malpedia")
+            continue
+
+        tasks.append((obj, malpedia_data))
+
+    # Each print() is a write (and, unbuffered, a flush), so multi-line
+    # output goes out as one call
+    if skip_lines:
+        print("\n".join(skip_lines))
+
+    # Feedly calls overlap on a small pool, paced by _fetch_feedly_paced;
+    # results are handled here, in order, because the SQLAlchemy session is
+    # not thread-safe
+    stop_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=FEEDLY_WORKERS)
+    futures = [
+        executor.submit(_fetch_feedly_paced, malpedia_data.get('uuid'), stop_event)
+        for _, malpedia_data in tasks
+    ]
+
+    for task_num, ((obj, malpedia_data), future) in enumerate(zip(tasks, futures), 1):
+        actor_id = obj.get("id")
+        name = obj.get("name")
+        description = obj.get("description", "")
+        aliases = obj.get("aliases", [])
+        motivation = obj.get("primary_motivation", "Unknown")
+
+        uuid = malpedia_data.get('uuid')
+
+        # Extract Malpedia enrichment data
+        meta = malpedia_data.get('meta', {})
+        attribution_confidence = meta.get('attribution-confidence')
+        type_of_incident = meta.get('cfr-type-of-incident', [])
+        references = meta.get('refs', [])
+        related = malpedia_data.get('related', [])
+
+        actor_num_display = f"{task_num}/{MAX_ACTORS_TO_ENRICH}" if MAX_ACTORS_TO_ENRICH > 0 else f"{task_num}"
+        print(f"[ACTOR {actor_num_display}] {name}\n  UUID: {uuid}")
 
-            if not malpedia_data:
-                actors_skipped_not_in_malpedia += 1
-                print(f"[SKIP] '{name}' - Not in Malpedia")
+        try:
+            called, feedly_data = future.result()
+            if called:
+                feedly_calls_made += 1
+            elif feedly_data is None:
+                print(f"  [SKIPPED] Enrichment aborted")
                 continue
+            else:
+                print(f"  [CACHED] Using Feedly response from disk")
 
-            uuid = malpedia_data.get('uuid')
-            
-            # Extract Malpedia enrichment data
-            meta = malpedia_data.get('meta', {})
-            attribution_confidence = meta.get('attribution-confidence')
-            type_of_incident = meta.get('cfr-type-of-incident', [])
-            references = meta.get('refs', [])
-            related = malpedia_data.get('related', [])
+            if feedly_data is None:
+                print(f"  [FAILED] No data from Feedly")
+                continue
 
-            # Construct Feedly entity ID
-            feedly_id = f"nlp/f/entity/gz:ta:{uuid}"
+            # Parse Feedly response
+            enriched = parse_feedly_response(feedly_data)
 
-            actor_num_display = f"{feedly_calls_made + 1}/{MAX_ACTORS_TO_ENRICH}" if MAX_ACTORS_TO_ENRICH > 0 else f"{feedly_calls_made + 1}"
-            print(f"[ACTOR {actor_num_display}] {name}")
-            print(f"  UUID: {uuid}")
+            if not enriched:
+                print(f"  [FAILED] Could not parse Feedly response")
+                continue
 
-            # Add delay to avoid rate limiting (except for first call)
-            if feedly_calls_made > 0:
-                time.sleep(DELAY_BETWEEN_FEEDLY_CALLS)
+            actors_enriched += 1
+            print(f"  [SUCCESS] {len(enriched.get('associated_malware', []))} malware, popularity={enriched.get('popularity', 0)}")
 
-            # Call Feedly API
-            feedly_calls_made += 1
+            # Use Feedly description if better
+            if enriched.get('description') and len(enriched.get('description', '')) > len(description):
+                description = enriched['description']
 
-            try:
-                feedly_data = fetch_feedly_threat_actor(feedly_id)
-
-                if feedly_data is None:
-                    print(f"  [FAILED] No data from Feedly")
-                    continue
-
-                # Parse Feedly response
-                enriched = parse_feedly_response(feedly_data)
-
-                if not enriched:
-                    print(f"  [FAILED] Could not parse Feedly response")
-                    continue
-
-                actors_enriched += 1
-                print(f"  [SUCCESS] {len(enriched.get('associated_malware', []))} malware, popularity={enriched.get('popularity', 0)}")
-
-                # Use Feedly description if better
-                if enriched.get('description') and len(enriched.get('description', '')) > len(description):
-                    description = enriched['description']
-
-                # Create actor with full enrichment
-                actors[actor_id] = ThreatActor(
-                    id=actor_id,
-                    name=name,
-                    description=description,
-                    aliases=json.dumps(aliases),
-                    motivation=motivation,
-                    origin_countries=json.dumps([enriched['origin_country']]),
-                    victim_sectors=json.dumps(enriched['victim_sectors']),
-                    victim_countries=json.dumps(enriched['victim_countries']),
-                    motivations=json.dumps(enriched.get('motivations', [])),
-                    associated_malware=json.dumps(enriched.get('associated_malware', [])),
-                    target_entities=json.dumps(enriched.get('target_entities', [])),
-                    popularity=enriched.get('popularity', 0),
-                    knowledge_base_url=enriched.get('knowledge_base_url', ''),
-                    badges=json.dumps(enriched.get('badges', [])),
-                    first_seen_at=enriched.get('first_seen_at', ''),
-                    feedly_id=enriched.get('feedly_id', ''),
-                    attribution_confidence=attribution_confidence,
-                    type_of_incident=json.dumps(type_of_incident),
-                    actor_references=json.dumps(references),
-                    related_actors=json.dumps(related)
-                )
-
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:
-                    print(f"\n[RATE LIMIT] Got 429 Too Many Requests from Feedly!")
-                    print(f"[ABORT] Stopping enrichment to avoid API abuse")
-                    rate_limit_hit = True
-                    break
-                else:
-                    print(f"  [ERROR] HTTP {e.response.status_code}: {e}")
-            except Exception as e:
-                print(f"  [ERROR] {e}")
-
-        elif obj_type == "attack-pattern":
-            # TTP
-            ttp_id = obj.get("id")
-            name = obj.get("name")
-            description = obj.get("description", "")
-
-            # Extract MITRE ID
-            mitre_id = None
-            for ref in obj.get("external_references", []):
-                if ref.get("source_name") == "mitre-attack":
-                    mitre_id = ref.get("external_id")
-                    break
-
-            # Extract Tactics
-            tactics = []
-            for phase in obj.get("kill_chain_phases", []):
-                if phase.get("kill_chain_name") == "mitre-attack":
-                    tactics.append(phase.get("phase_name"))
-
-            ttps[ttp_id] = TTP(
-                id=ttp_id,
-                mitre_id=mitre_id,
+            # Create actor with full enrichment
+            name_lc, aliases_lc = build_search_keys(name, aliases)
+            actors[actor_id] = dict(
+                id=actor_id,
                 name=name,
                 description=description,
-                tactics=json.dumps(tactics)
+                aliases=_dumps(aliases),
+                name_lc=name_lc,
+                aliases_lc=aliases_lc,
+                motivation=motivation,
+                origin_countries=_dumps_interned([enriched['origin_country']]),
+                victim_sectors=_dumps_interned(enriched['victim_sectors']),
+                victim_countries=_dumps(enriched['victim_countries']),
+                motivations=_dumps_interned(enriched.get('motivations', [])),
+                associated_malware=_dumps(enriched.get('associated_malware', [])),
+                target_entities=_dumps(enriched.get('target_entities', [])),
+                popularity=enriched.get('popularity', 0),
+                knowledge_base_url=enriched.get('knowledge_base_url', ''),
+                badges=_dumps_interned(enriched.get('badges', [])),
+                first_seen_at=enriched.get('first_seen_at', ''),
+                feedly_id=enriched.get('feedly_id', ''),
+                attribution_confidence=attribution_confidence,
+                type_of_incident=_dumps(type_of_incident),
+                actor_references=_dumps(references),
+                related_actors=_dumps(related)
             )
 
-        elif obj_type == "relationship":
-            relationships.append(obj)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 429:
+                feedly_calls_made += 1
+                # The HTTP adapter already retried honoring Retry-After; a 429
+                # surfacing here means the quota is exhausted
+                print(f"\n[RATE LIMIT] Got 429 Too Many Requests from Feedly!")
+                print(f"[ABORT] Stopping enrichment to avoid API abuse")
+                rate_limit_hit = True
+                break
+            else:
+                print(f"  [ERROR] HTTP {e.response.status_code}: {e}")
+        except Exception as e:
+            print(f"  [ERROR] {e}")
+
+    # Stop queued calls after a 429; in-flight ones finish and are discarded
+    stop_event.set()
+    executor.shutdown(wait=True, cancel_futures=True)
 
     # STEP 4: Save to database
     print()
     print("[4/4] Saving to database...")
 
     try:
-        # Merge actors with changelog tracking
+        # Merge actors with changelog tracking: one SELECT for every actor that
+        # already exists, then batched INSERT/UPDATE statements
+        existing_rows = db.session.query(ThreatActor.id, *_TRACKED_ACTOR_COLUMNS).filter(
+            ThreatActor.id.in_(list(actors))
+        ).all()
+        existing = {row[0]: row[1:] for row in existing_rows}
+
+        actor_inserts = []
+        actor_updates = []
+        changelog_rows = []
         for id, actor in actors.items():
-            existing_actor = ThreatActor.query.get(id)
-            
-            if existing_actor:
+            old_values = existing.get(id)
+
+            if old_values is not None:
                 # Update existing actor and track changes
-                changes = []
-                
-                # List of fields to track
-                fields_to_track = [
-                    'name', 'description', 'aliases', 'origin_countries', 
-                    'victim_sectors', 'victim_countries', 'motivation', 
-                    'motivations', 'associated_malware', 'target_entities', 
-                    'popularity', 'knowledge_base_url', 'badges', 
-                    'first_seen_at', 'feedly_id', 'attribution_confidence', 
-                    'type_of_incident', 'actor_references', 'related_actors'
-                ]
-                
-                for field in fields_to_track:
-                    old_val = getattr(existing_actor, field)
-                    new_val = getattr(actor, field)
-                    
-                    # Normalize for comparison (handle None vs empty string/list)
-                    if old_val != new_val:
+                update = {'id': id}
+                for field, old_val in zip(TRACKED_ACTOR_FIELDS, old_values):
+                    new_val = actor[field]
+
+                    if _field_changed(field, old_val, new_val):
                         # Create changelog entry
-                        change = Changelog(
-                            actor_id=id,
-                            field_name=field,
-                            old_value=str(old_val),
-                            new_value=str(new_val),
-                            action='update'
-                        )
-                        db.session.add(change)
-                        # Update the field
-                        setattr(existing_actor, field, new_val)
-                
+                        changelog_rows.append({
+                            'actor_id': id,
+                            'field_name': field,
+                            'old_value': str(old_val),
+                            'new_value': str(new_val),
+                            'action': 'update'
+                        })
+                        update[field] = new_val
+
+                # Keep derived search keys in sync (not tracked in the changelog)
+                update['name_lc'] = actor['name_lc']
+                update['aliases_lc'] = actor['aliases_lc']
+                actor_updates.append(update)
+
             else:
                 # New actor
-                db.session.add(actor)
+                actor_inserts.append(actor)
                 # Log creation
-                change = Changelog(
-                    actor_id=id,
-                    field_name='all',
-                    old_value=None,
-                    new_value='Created',
-                    action='create'
-                )
-                db.session.add(change)
+                changelog_rows.append({
+                    'actor_id': id,
+                    'field_name': 'all',
+                    'old_value': None,
+                    'new_value': 'Created',
+                    'action': 'create'
+                })
+
+        db.session.bulk_insert_mappings(ThreatActor, actor_inserts)
+        db.session.bulk_update_mappings(ThreatActor, actor_updates)
+        # All changelog rows go out as a single executemany
+        if changelog_rows:
+            db.session.execute(Changelog.__table__.insert(), changelog_rows)
 
         # Merge TTPs (Simple merge for now, TTPs are static from MITRE mostly)
-        for id, ttp in ttps.items():
-            db.session.merge(ttp)
+        existing_ttp_ids = {row[0] for row in db.session.query(TTP.id).filter(TTP.id.in_(list(ttps)))}
+        db.session.bulk_insert_mappings(TTP, [ttp for id, ttp in ttps.items() if id not in existing_ttp_ids])
+        db.session.bulk_update_mappings(TTP, [ttp for id, ttp in ttps.items() if id in existing_ttp_ids])
 
         db.session.commit()
         print(f"[SUCCESS] Saved {len(actors)} actors and {len(ttps)} TTPs")
 
         # Process Relationships
         print(f"[INFO] Processing {len(relationships)} relationships...")
-        ttp_links_added = 0
-
-        for rel in relationships:
-            source_ref = rel.get("source_ref")
-            target_ref = rel.get("target_ref")
-
-            if source_ref in actors and target_ref in ttps:
-                # We need to fetch the persistent object from the session or DB
-                # because 'actors' dict holds transient objects for new ones
-                actor = ThreatActor.query.get(source_ref) 
-                ttp = TTP.query.get(target_ref)
 
-                if actor and ttp and ttp not in actor.ttps:
-                    actor.ttps.append(ttp)
-                    ttp_links_added += 1
+        # Both endpoints were saved above, so links can go straight into the
+        # association table; only pairs not already linked are inserted
+        links = {
+            (source_ref, target_ref) for source_ref, target_ref in relationships
+            if source_ref in actors and target_ref in ttps
+        }
+        existing_links = {tuple(row) for row in db.session.query(actor_ttp.c.actor_id, actor_ttp.c.ttp_id).filter(
+            actor_ttp.c.actor_id.in_(list(actors))
+        )}
+        new_links = [{'actor_id': actor_id, 'ttp_id': ttp_id} for actor_id, ttp_id in links - existing_links]
+        if new_links:
+            db.session.execute(actor_ttp.insert(), new_links)
+        ttp_links_added = len(new_links)
 
         db.session.commit()
         print(f"[SUCCESS] Linked {ttp_links_added} TTPs to actors")
 
         # Final summary
-        print()
-        print("=" * 70)
-        print("INGESTION SUMMARY")
-        print("=" * 70)
-        print(f"Malpedia API calls:            1")
-        print(f"Total MITRE actors found:      {total_mitre_actors}")
-        print(f"Feedly API calls made:         {feedly_calls_made}")
-        print(f"Actors enriched & saved:       {actors_enriched}")
-        print(f"Actors skipped (not in Malpedia): {actors_skipped_not_in_malpedia}")
-        print(f"Actors skipped (limit reached): {actors_skipped_limit_reached}")
-        print(f"TTPs linked:                   {ttp_links_added}")
-        print(f"Rate limit hit:                {'YES - Stopped early' if rate_limit_hit else 'No'}")
-        print("=" * 70)
-        print()
+        print("\n".join((
+            "",
+            "=" * 70,
+            "INGESTION SUMMARY",
+            "=" * 70,
+            f"Malpedia API calls:            1",
+            f"Total MITRE actors found:      {total_mitre_actors}",
+            f"Feedly API calls made:         {feedly_calls_made}",
+            f"Actors enriched & saved:       {actors_enriched}",
+            f"Actors skipped (not in Malpedia): {actors_skipped_not_in_malpedia}",
+            f"Actors skipped (limit reached): {actors_skipped_limit_reached}",
+            f"TTPs linked:                   {ttp_links_added}",
+            f"Rate limit hit:                {'YES - Stopped early' if rate_limit_hit else 'No'}",
+            "=" * 70,
+            "",
+        )))
 
         if actors_enriched > 0:
             print(f"[SUCCESS] Ingestion complete! {actors_enriched} actors ready to view.")